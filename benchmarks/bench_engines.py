@@ -0,0 +1,52 @@
+# benchmarks/bench_engines.py
+"""Per-step timings of the agent backend vs the vectorized car engine.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_engines --agents 100 1000 --map-size 120
+
+Both backends use routing="field" and start from the same populated grid,
+so the arrivals and stopped cars they report can be compared directly.
+"""
+import argparse
+import time
+
+from src.model.city_model import CityModel, ENGINES
+from src.model.map_generator import generated_map
+
+from .bench_pathfinding import BASE_MAP
+from .suite import populate
+
+
+def run(engine, agents, map_file, steps, seed):
+    model = CityModel(
+        agents, map_file=map_file, routing="field", seed=seed, engine=engine
+    )
+    populate(model, agents)
+    started = time.perf_counter()
+    for _ in range(steps):
+        model.step()
+    per_step = (time.perf_counter() - started) / steps
+    print(
+        f"{engine:<10} N={agents:<6} cars {model.car_count:>6}  "
+        f"arrived {model.reached_destination:>6}  "
+        f"stopped {model.stopped_cars:>6}  "
+        f"{per_step * 1e3:9.3f} ms/step"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--map-size", type=int, default=None)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    map_file = generated_map(args.map_size) if args.map_size else BASE_MAP
+    for agents in args.agents:
+        for engine in ENGINES:
+            run(engine, agents, map_file, args.steps, args.seed)
+
+
+if __name__ == "__main__":
+    main()
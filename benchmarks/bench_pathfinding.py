@@ -0,0 +1,136 @@
+# benchmarks/bench_pathfinding.py
+"""Per-search A* timings: the original list-copying search vs PathFinder.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pathfinding --tiles 1 2 4
+
+Larger maps are built by tiling city_files/2022_base.txt. Every query is
+checked to return the same route with both implementations.
+"""
+import argparse
+import heapq
+import os
+import tempfile
+import time
+
+from src.agents.car import Car
+from src.model.city_model import CityModel
+
+BASE_MAP = "city_files/2022_base.txt"
+
+
+def legacy_find_path(car, start, goal):
+    """The A* that Car.find_path used before PathFinder, kept as reference."""
+    grid = car.model.grid
+    open_set = [(car._calculate_manhattan_distance(start, goal), 0, start, [start])]
+    closed_set = set()
+
+    while open_set:
+        _, g_score, current, path = heapq.heappop(open_set)
+        if current == goal:
+            return path[1:]
+        if current in closed_set:
+            continue
+        closed_set.add(current)
+
+        for neighbor in grid.get_neighborhood(
+            current, moore=False, include_center=False
+        ):
+            if not car._is_valid_move(current, neighbor) or neighbor in closed_set:
+                continue
+            tentative = g_score + 1
+            if any(item[2] == neighbor and tentative >= item[1] for item in open_set):
+                continue
+            heapq.heappush(
+                open_set,
+                (
+                    tentative + car._calculate_manhattan_distance(neighbor, goal),
+                    tentative,
+                    neighbor,
+                    path + [neighbor],
+                ),
+            )
+    return []
+
+
+def write_tiled_map(tiles):
+    """Write the base map repeated tiles x tiles times and return its path."""
+    with open(BASE_MAP) as base_file:
+        rows = [line.rstrip("\n") for line in base_file]
+    handle, path = tempfile.mkstemp(suffix=".txt", text=True)
+    with os.fdopen(handle, "w") as out:
+        for _ in range(tiles):
+            for row in rows:
+                out.write(row * tiles + "\n")
+    return path
+
+
+def build_queries(model, count):
+    """Pairs of (road cell, destination) chosen with the model's RNG."""
+    index = model.cell_index
+    roads = [
+        (x, y)
+        for x in range(model.width)
+        for y in range(model.height)
+        if index.is_road((x, y))
+    ]
+    destinations = [
+        (x, y)
+        for x in range(model.width)
+        for y in range(model.height)
+        if index.is_destination((x, y))
+    ]
+    return [
+        (model.random.choice(roads), model.random.choice(destinations))
+        for _ in range(count)
+    ]
+
+
+def time_queries(search, queries):
+    started = time.perf_counter()
+    routes = [search(start, goal) for start, goal in queries]
+    return (time.perf_counter() - started) / len(queries), routes
+
+
+def run(tiles, queries_per_map):
+    map_file = BASE_MAP if tiles == 1 else write_tiled_map(tiles)
+    try:
+        model = CityModel(0, map_file=map_file)
+    finally:
+        if map_file != BASE_MAP:
+            os.remove(map_file)
+    car = Car("car_bench", model)
+    queries = build_queries(model, queries_per_map)
+
+    legacy, legacy_routes = time_queries(
+        lambda start, goal: legacy_find_path(car, start, goal), queries
+    )
+    current, routes = time_queries(
+        lambda start, goal: model.path_finder.find_path(
+            start, goal, car._is_cell_blocked
+        ),
+        queries,
+    )
+    if routes != legacy_routes:
+        raise AssertionError(f"Routes differ on the {tiles}x{tiles} map")
+
+    print(
+        f"{model.width:>4}x{model.height:<4} "
+        f"legacy {legacy * 1e3:8.3f} ms  "
+        f"PathFinder {current * 1e3:8.3f} ms  "
+        f"speedup {legacy / current:6.1f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tiles", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    for tiles in args.tiles:
+        run(tiles, args.queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/bench_replanning.py
+"""Rerouting blocked cars: full A* searches vs PathFinder.repair.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_replanning --agents 1500 --map-size 100
+
+The map is packed with astar-routed cars and run until queues form. Then
+every car whose next cell holds another car is rerouted three ways:
+
+- "old": a full A* that treats every car on the map as a wall, like the
+  old find_alternate_path. In queues it mostly fails at once.
+- "scratch": a full A* with the same walls as the repair, only the cars
+  within REPAIR_RADIUS, so it solves the same problem from scratch.
+- "repair": PathFinder.repair, which keeps the rest of the path, guided
+  by the Manhattan distance like the cars without a cached field.
+- "field": the same repair guided by the destination's distance field,
+  built beforehand as when the model already holds it.
+
+Times are per blocked car and per route found.
+"""
+import argparse
+import time
+
+from src.model.city_model import CityModel
+from src.model.map_generator import generated_map
+from src.model.pathfinding import REPAIR_RADIUS
+
+from .bench_pathfinding import BASE_MAP
+from .suite import populate
+
+
+def blocked_cars(model):
+    return [
+        car
+        for car in model.cars.values()
+        if car.path and car._check_collision(car.path[0])
+    ]
+
+
+def run(agents, map_file, warmup, seed):
+    model = CityModel(agents, map_file=map_file, routing="astar", seed=seed)
+    populate(model, agents)
+    for _ in range(warmup):
+        model.step()
+    cars = blocked_cars(model)
+    if not cars:
+        print(f"N={agents}: no blocked cars after {warmup} steps")
+        return
+
+    finder = model.path_finder
+    height = model.height
+    starts = [car.pos[0] * height + car.pos[1] for car in cars]
+    fields = [model.distance_field(car.destination.pos) for car in cars]
+
+    def near_walls(car):
+        x, y = car.pos
+
+        def blocked(cell):
+            return (
+                abs(cell // height - x) + abs(cell % height - y) <= REPAIR_RADIUS
+                and car._is_cell_blocked(cell)
+            )
+
+        return blocked
+
+    def old(car, start, field):
+        return car.find_path()
+
+    def scratch(car, start, field):
+        goal = car.destination.pos
+        return finder.search(start, goal[0] * height + goal[1], near_walls(car))
+
+    def repair(car, start, field):
+        cells = [x * height + y for x, y in car.path]
+        return finder.repair(start, cells, car._is_cell_blocked)[0]
+
+    def field_repair(car, start, field):
+        cells = [x * height + y for x, y in car.path]
+        return finder.repair(start, cells, car._is_cell_blocked, field)[0]
+
+    line = f"{model.width}x{model.height} N={agents:<6} blocked {len(cars):>5}"
+    for name, reroute in (
+        ("old", old),
+        ("scratch", scratch),
+        ("repair", repair),
+        ("field", field_repair),
+    ):
+        started = time.perf_counter()
+        found = sum(
+            bool(reroute(car, start, field))
+            for car, start, field in zip(cars, starts, fields)
+        )
+        elapsed = time.perf_counter() - started
+        per_route = f"{elapsed / found * 1e6:8.1f}" if found else "       -"
+        line += (
+            f"  {name} {elapsed / len(cars) * 1e6:7.1f} us"
+            f" / {per_route} us per route ({found})"
+        )
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, nargs="+", default=[150])
+    parser.add_argument("--map-size", type=int, default=None)
+    parser.add_argument("--warmup", type=int, default=20, help="steps before timing")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    map_file = generated_map(args.map_size) if args.map_size else BASE_MAP
+    for agents in args.agents:
+        run(agents, map_file, args.warmup, args.seed)
+
+
+if __name__ == "__main__":
+    main()
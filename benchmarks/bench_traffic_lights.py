@@ -0,0 +1,146 @@
+# benchmarks/bench_traffic_lights.py
+"""Traffic-light setup: the original all-lights scans vs the position lookups.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_traffic_lights --map-sizes 200 400
+
+Times light pairing, the table of crossing pairs that used to be rebuilt
+by every Traffic_Light, and a full CityModel construction. A 400x400
+generated map has about 10k lights. The old and new code must give the
+same pair ids, orientations and crossings on every map.
+"""
+import argparse
+import time
+
+from src.model.city_model import CityModel
+from src.model.map_generator import generated_map
+from src.model.static_map import (
+    find_neighbor_pairs,
+    load_static_map,
+    pair_traffic_lights,
+)
+
+from .bench_pathfinding import BASE_MAP
+
+
+def legacy_pair_traffic_lights(positions):
+    """The CityModel.pair_traffic_lights loop before the lookup, as reference."""
+    paired_lights = {}
+    pair_orientations = {}
+    remaining_positions = list(positions)
+    pair_id = 1
+
+    while remaining_positions:
+        pos1, col1 = remaining_positions.pop(0)
+        closest_pair = None
+        min_distance = float("inf")
+
+        for i, (pos2, col2) in enumerate(remaining_positions):
+            dx = abs(pos1[0] - pos2[0])
+            dy = abs(pos1[1] - pos2[1])
+
+            if (dx == 0 and dy == 1) or (dy == 0 and dx == 1):
+                dist = dx + dy
+                if dist < min_distance:
+                    min_distance = dist
+                    closest_pair = i
+
+        if closest_pair is not None:
+            pos2, col2 = remaining_positions.pop(closest_pair)
+            paired_lights[pos1, col1] = pair_id
+            paired_lights[pos2, col2] = pair_id
+            is_horizontal = pos1[1] == pos2[1]
+            pair_orientations[pair_id] = "horizontal" if is_horizontal else "vertical"
+            pair_id += 1
+        else:
+            paired_lights[pos1, col1] = pair_id
+            pair_id += 1
+
+    return paired_lights, pair_orientations
+
+
+def legacy_neighbor_pairs(positions, paired_lights, pair_orientations):
+    """Traffic_Light.get_neighboring_pairs for every pair, scanning all lights."""
+    lights = [(pos, paired_lights[pos, col]) for pos, col in positions]
+    neighbors = {}
+    for pair_id in {pair_id for _, pair_id in lights}:
+        found = set()
+        for (our_x, our_y), member in lights:
+            if member != pair_id:
+                continue
+            for (other_x, other_y), other in lights:
+                if (
+                    other != pair_id
+                    and pair_orientations.get(other) != pair_orientations.get(pair_id)
+                    and abs(other_x - our_x) <= 2
+                    and abs(other_y - our_y) <= 2
+                ):
+                    found.add(other)
+        neighbors[pair_id] = tuple(sorted(found))
+    return neighbors
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def compare(name, current, result, legacy, positions, map_file):
+    reference, expected = timed(legacy, *positions)
+    if result != expected:
+        raise AssertionError(f"{name} differ on {map_file}")
+    return (
+        f"  legacy {reference * 1e3:10.2f} ms"
+        f"  speedup {reference / current:7.1f}x"
+    )
+
+
+def run(map_file, legacy=True):
+    static_map = load_static_map(map_file)
+    positions = static_map.light_positions
+    pair_time, pairs = timed(pair_traffic_lights, positions)
+    neighbor_time, neighbors = timed(find_neighbor_pairs, positions, *pairs)
+    init_time, _ = timed(CityModel, 0, map_file)
+
+    print(f"{static_map.width:>4}x{static_map.height:<4} lights {len(positions):>6}")
+    line = f"    pairing   {pair_time * 1e3:10.2f} ms"
+    if legacy:
+        line += compare(
+            "Pairs",
+            pair_time,
+            pairs,
+            legacy_pair_traffic_lights,
+            (positions,),
+            map_file,
+        )
+    print(line)
+    line = f"    crossings {neighbor_time * 1e3:10.2f} ms"
+    if legacy:
+        line += compare(
+            "Crossings",
+            neighbor_time,
+            neighbors,
+            legacy_neighbor_pairs,
+            (positions, *pairs),
+            map_file,
+        )
+    print(line)
+    print(f"    CityModel {init_time * 1e3:10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--map-sizes", type=int, nargs="+", default=[100, 200, 400])
+    parser.add_argument(
+        "--no-legacy", action="store_true", help="skip the quadratic reference"
+    )
+    args = parser.parse_args()
+    run(BASE_MAP, not args.no_legacy)
+    for size in args.map_sizes:
+        run(generated_map(size), not args.no_legacy)
+
+
+if __name__ == "__main__":
+    main()
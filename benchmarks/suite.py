@@ -0,0 +1,298 @@
+# benchmarks/suite.py
+"""Benchmark suite with stored baselines.
+
+Run from the repository root:
+
+    python -m benchmarks.suite                  # run and print
+    python -m benchmarks.suite --save           # store results as the baseline
+    python -m benchmarks.suite --compare        # flag regressions vs the baseline
+    python -m benchmarks.suite --map-sizes 120 480   # also sweep generated maps
+
+Each case reports the median and best time of several repetitions. Compare
+mode exits with status 1 when a case's median is slower than the stored
+median by more than --threshold (a fraction, 0.25 = 25%). --save only
+replaces the cases that ran, so a new case is stored with --save --only
+<case>; every change that adds or alters a case should store it.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from src.agents.car import Car
+from src.model.cell_index import ROAD
+from src.model.city_model import CityModel
+from src.model.map_generator import generated_map
+from src.visualization.trafficServer import (
+    pack_frame,
+    serialize_changes,
+    serialize_state,
+)
+
+from .bench_pathfinding import BASE_MAP, build_queries
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+###################
+# MODEL SETUP
+###################
+
+
+def build_model(agents, map_file=BASE_MAP, seed=0):
+    """CityModel filled with `agents` cars"""
+    model = CityModel(agents, map_file=map_file, seed=seed)
+    populate(model, agents)
+    return model
+
+
+def populate(model, agents):
+    """Place cars on random free road cells until the model holds `agents`"""
+    free_roads = [
+        (x, y)
+        for x in range(model.width)
+        for y in range(model.height)
+        if model.cell_index.kind_at((x, y)) == ROAD
+        and not model.is_occupied((x, y))
+    ]
+    model.random.shuffle(free_roads)
+    while model.car_count < agents and free_roads:
+        model.spawn_car(free_roads.pop())
+
+
+# END MODEL SETUP
+
+###################
+# CASES
+###################
+
+
+def bench_model_init(agents=100, map_file=BASE_MAP):
+    def setup():
+        return None
+
+    def run(_):
+        CityModel(agents, map_file=map_file)
+
+    return setup, run, 1
+
+
+def bench_step(agents, map_file=BASE_MAP, steps=10):
+    def setup():
+        return build_model(agents, map_file)
+
+    def run(model):
+        for _ in range(steps):
+            model.step()
+
+    return setup, run, steps
+
+
+def bench_find_path(queries=50, map_file=BASE_MAP):
+    def setup():
+        model = CityModel(0, map_file=map_file, seed=0)
+        car = Car("car_bench", model)
+        return car, build_queries(model, queries)
+
+    def run(state):
+        car, pairs = state
+        for start, goal in pairs:
+            car.model.path_finder.find_path(start, goal, car._is_cell_blocked)
+
+    return setup, run, queries
+
+
+def bench_light_phases(steps=30):
+    """Phase changes of every light over a full signal cycle"""
+
+    def setup():
+        return CityModel(0)
+
+    def run(model):
+        model.phase_wheel.reset(0)
+        for step in range(steps):
+            model.phase_wheel.advance(step)
+
+    return setup, run, steps
+
+
+def bench_state_serialization(agents=100, map_file=BASE_MAP):
+    def setup():
+        return build_model(agents, map_file)
+
+    def run(model):
+        json.dumps(serialize_state(model))
+
+    return setup, run, 1
+
+
+def bench_state_delta(agents=1000, map_file=None, warmup=10):
+    """One step of changes vs the full state, at high car counts.
+
+    populate() spawns every car after the step-0 commit, so the first
+    step's delta holds all of them; `warmup` steps run first so the case
+    measures a steady-state step.
+    """
+
+    def setup():
+        model = build_model(agents, map_file or generated_map(80))
+        for _ in range(warmup + 1):
+            model.step()
+        delta = json.dumps(serialize_changes(model, model.change_log.step - 1))
+        assert len(delta) < len(json.dumps(serialize_state(model))) / 2
+        return model
+
+    def run(model):
+        json.dumps(serialize_changes(model, model.change_log.step - 1))
+
+    return setup, run, 1
+
+
+def bench_frame(agents=1000, map_file=None):
+    """Binary frame of the same model as state_serialization_n1000"""
+
+    def setup():
+        return build_model(agents, map_file or generated_map(80))
+
+    def run(model):
+        pack_frame(model)
+
+    return setup, run, 1
+
+
+def sized_cases(size):
+    """Map-dependent cases on a generated size x size map"""
+    map_file = generated_map(size)
+    return {
+        f"model_init@{size}": lambda: bench_model_init(map_file=map_file),
+        f"step_n100@{size}": lambda: bench_step(100, map_file),
+        f"find_path@{size}": lambda: bench_find_path(map_file=map_file),
+    }
+
+
+CASES = {
+    "model_init": bench_model_init,
+    "step_n10": lambda: bench_step(10),
+    "step_n100": lambda: bench_step(100),
+    # The base map only has 600 drivable cells
+    "step_n1000": lambda: bench_step(1000, generated_map(80)),
+    "find_path": bench_find_path,
+    "light_phases": bench_light_phases,
+    "state_serialization": bench_state_serialization,
+    "state_serialization_n1000": lambda: bench_state_serialization(
+        1000, generated_map(80)
+    ),
+    "state_delta_n1000": bench_state_delta,
+    "frame_n1000": bench_frame,
+}
+
+# END CASES
+
+###################
+# RUNNER
+###################
+
+
+def measure(case, repeat):
+    """Seconds per unit of work: (median, best) over `repeat` fresh setups"""
+    setup, run, units = CASES[case]()
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        started = time.perf_counter()
+        run(state)
+        timings.append((time.perf_counter() - started) / units)
+    return statistics.median(timings), min(timings)
+
+
+def run_suite(cases, repeat):
+    results = {}
+    width = max(map(len, cases))
+    for case in cases:
+        median, best = measure(case, repeat)
+        results[case] = {"median": median, "best": best}
+        print(
+            f"{case:<{width}} median {median * 1e3:10.3f} ms"
+            f"  best {best * 1e3:10.3f} ms"
+        )
+    return results
+
+
+def save_baseline(results, path):
+    """Store results, keeping the stored cases that were not run this time"""
+    stored = {}
+    if os.path.exists(path):
+        with open(path) as baseline_file:
+            stored = json.load(baseline_file)["results"]
+    with open(path, "w") as out:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": {**stored, **results},
+            },
+            out,
+            indent=2,
+        )
+
+
+def compare(results, baseline, threshold):
+    """Print the change per case and return the names that regressed"""
+    regressions = []
+    missing = []
+    width = max(map(len, results))
+    for case, result in results.items():
+        stored = baseline["results"].get(case)
+        if stored is None:
+            print(f"{case:<{width}} no baseline")
+            missing.append(case)
+            continue
+        change = result["median"] / stored["median"] - 1
+        flag = "REGRESSION" if change > threshold else "ok"
+        print(f"{case:<{width}} {change:+8.1%}  {flag}")
+        if change > threshold:
+            regressions.append(case)
+    if missing:
+        print(f"Store the missing cases with --save --only {' '.join(missing)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CityModel benchmark suite")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), default=None)
+    parser.add_argument("--map-sizes", type=int, nargs="+", default=[])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save", action="store_true", help="store as baseline")
+    parser.add_argument("--compare", action="store_true", help="check baseline")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+
+    cases = args.only or list(CASES)
+    for size in args.map_sizes:
+        sized = sized_cases(size)
+        CASES.update(sized)
+        cases.extend(sized)
+
+    results = run_suite(cases, args.repeat)
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+# END RUNNER
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
 # src/agents/car.py
 
 from mesa import Agent
-from .road import Road
-from .traffic_light import Traffic_Light
 from .destination import Destination
-from typing import Tuple, Optional, List
-import heapq
+from typing import Tuple, Optional
 
+# Blocked steps in a row before a car reroutes; on the first one the car
+# ahead may simply not have moved yet this step
+REPLAN_PATIENCE = 2
 
 class Car(Agent):
     """A car agent that moves through the city following roads and traffic rules."""
@@ -15,25 +15,38 @@ class Car(Agent):
     # INITIALIZATION
     ###################
 
-    def __init__(self, unique_id, model):
+    def __init__(self, unique_id, model, index=None):
         super().__init__(unique_id, model)
-        self.state = "moving"
+        self.index = model.next_car_index() if index is None else index
+        self._state = "moving"
         self.speed = 1
         self.destination = self._assign_destination()
         self.path = None
         self.last_position = None
         self.stuck_counter = 0
+        # Walls of the last failed repair, see replan
+        self.blocked_by = None
 
     def _assign_destination(self) -> Optional["Destination"]:
         """Assigns a random destination to the car"""
-        destinations = [
-            agent
-            for agents, pos in self.model.grid.coord_iter()
-            for agent in agents
-            if isinstance(agent, Destination)
-        ]
+        destinations = self.model.destinations
         return self.random.choice(destinations) if destinations else None
 
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @state.setter
+    def state(self, value: str):
+        """Keeps the model's stopped-car counter in step with car states"""
+        if value == self._state:
+            return
+        if self._state == "stopped":
+            self.model.stopped_cars -= 1
+        elif value == "stopped":
+            self.model.stopped_cars += 1
+        self._state = value
+
     ###################
     # POSITION AND DISTANCE CALCULATIONS
     ###################
@@ -60,46 +73,36 @@ class Car(Agent):
         if not self._is_valid_position(position):
             return False
 
-        cell_contents = self.model.grid.get_cell_list_contents(position)
-        return any(
-            isinstance(content, (Road, Traffic_Light)) for content in cell_contents
-        ) and all(
-            isinstance(content, (Road, Traffic_Light)) for content in cell_contents
-        )
+        return self.model.cell_index.is_drivable(
+            position
+        ) and not self._check_collision(position)
 
     def _check_collision(self, position: Tuple[int, int]) -> bool:
         """Checks if there's a collision at the given position"""
-        cell_contents = self.model.grid.get_cell_list_contents(position)
-        return any(isinstance(obj, Car) for obj in cell_contents)
+        cell = position[0] * self.model.height + position[1]
+        return self.model.occupancy[cell] >= 0
 
     def _get_traffic_light_state(self, position: Tuple[int, int]) -> bool:
         """Gets traffic light state at position. Returns True if green or no light."""
-        cell_contents = self.model.grid.get_cell_list_contents(position)
-        traffic_light = next(
-            (obj for obj in cell_contents if isinstance(obj, Traffic_Light)), None
-        )
+        traffic_light = self.model.cell_index.light_at(position)
         return traffic_light.state if traffic_light else True
 
     ###################
     # ROAD AND TRAFFIC LIGHT HANDLING
     ###################
 
-    def _get_current_road(self) -> Optional["Road"]:
-        """Gets the road at current position"""
-        cell_contents = self.model.grid.get_cell_list_contents(self.pos)
-        return next((obj for obj in cell_contents if isinstance(obj, Road)), None)
+    def _get_current_direction(self) -> Optional[str]:
+        """Gets the direction of the road at current position"""
+        return self.model.cell_index.direction_at(self.pos)
 
-    def _get_adjacent_road(self) -> Optional["Road"]:
-        """Gets adjacent road when on traffic light"""
+    def _get_adjacent_direction(self) -> Optional[str]:
+        """Gets the direction of an adjacent road when on traffic light"""
         for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
             check_pos = (self.pos[0] + dx, self.pos[1] + dy)
             if self._is_valid_position(check_pos):
-                cell_contents = self.model.grid.get_cell_list_contents(check_pos)
-                road = next(
-                    (obj for obj in cell_contents if isinstance(obj, Road)), None
-                )
-                if road:
-                    return road
+                direction = self.model.cell_index.direction_at(check_pos)
+                if direction:
+                    return direction
         return None
 
     ###################
@@ -108,16 +111,14 @@ class Car(Agent):
 
     def _get_next_position(self) -> Optional[Tuple[int, int]]:
         """Determines next position based on current location and destination"""
-        current_contents = self.model.grid.get_cell_list_contents(self.pos)
-
-        if any(isinstance(obj, Traffic_Light) for obj in current_contents):
+        if self.model.cell_index.light_at(self.pos) is not None:
             return self._handle_traffic_light_movement()
         return self._handle_road_movement()
 
     def _handle_traffic_light_movement(self) -> Optional[Tuple[int, int]]:
         """Handle movement when car is on a traffic light"""
-        current_road = self._get_adjacent_road()
-        if not current_road:
+        direction = self._get_adjacent_direction()
+        if not direction:
             return None
 
         direction_map = {
@@ -127,8 +128,8 @@ class Car(Agent):
             "Down": (0, -1),
         }
 
-        if current_road.direction in direction_map:
-            dx, dy = direction_map[current_road.direction]
+        if direction in direction_map:
+            dx, dy = direction_map[direction]
             next_pos = (self.pos[0] + dx, self.pos[1] + dy)
             return next_pos if self._is_valid_path(next_pos) else None
 
@@ -136,8 +137,8 @@ class Car(Agent):
 
     def _handle_road_movement(self) -> Optional[Tuple[int, int]]:
         """Handle movement when car is on a regular road"""
-        current_road = self._get_current_road()
-        if not current_road:
+        direction = self._get_current_direction()
+        if not direction:
             return None
 
         direction_map = {
@@ -147,8 +148,8 @@ class Car(Agent):
             "Down": (0, -1),
         }
 
-        if current_road.direction in direction_map:
-            dx, dy = direction_map[current_road.direction]
+        if direction in direction_map:
+            dx, dy = direction_map[direction]
             next_pos = (self.pos[0] + dx, self.pos[1] + dy)
             return next_pos if self._is_valid_path(next_pos) else None
 
@@ -163,49 +164,13 @@ class Car(Agent):
         if not self.destination:
             return []
 
-        start, goal = self.pos, self.destination.pos
-        open_set = [
-            (0 + self._calculate_manhattan_distance(start, goal), 0, start, [start])
-        ]
-        closed_set = set()
-
-        while open_set:
-            f_score, g_score, current, path = heapq.heappop(open_set)
-
-            if current == goal:
-                return path[1:]
-
-            if current in closed_set:
-                continue
-            closed_set.add(current)
-
-            for neighbor in self._get_valid_neighbors(current):
-                if neighbor in closed_set:
-                    continue
-
-                tentative_g_score = g_score + 1
-                if not self._is_better_path(neighbor, tentative_g_score, open_set):
-                    continue
-
-                heapq.heappush(
-                    open_set,
-                    (
-                        tentative_g_score
-                        + self._calculate_manhattan_distance(neighbor, goal),
-                        tentative_g_score,
-                        neighbor,
-                        path + [neighbor],
-                    ),
-                )
-
-        return []
-
-    def _get_valid_neighbors(self, current: Tuple[int, int]) -> List[Tuple[int, int]]:
-        """Get valid neighboring positions for pathfinding."""
-        neighbors = self.model.grid.get_neighborhood(
-            current, moore=False, include_center=False
+        return self.model.path_finder.find_path(
+            self.pos, self.destination.pos, self._is_cell_blocked
         )
-        return [n for n in neighbors if self._is_valid_move(current, n)]
+
+    def _is_cell_blocked(self, cell: int) -> bool:
+        """Collision check by cell id, used by the path finder."""
+        return self.model.occupancy[cell] >= 0
 
     def _is_valid_move(
         self, current: Tuple[int, int], neighbor: Tuple[int, int]
@@ -214,41 +179,53 @@ class Car(Agent):
         if self._check_collision(neighbor):
             return False
 
-        intended_direction = (neighbor[0] - current[0], neighbor[1] - current[1])
-        direction_map = {
-            (1, 0): "Left",
-            (-1, 0): "Right",
-            (0, 1): "Down",
-            (0, -1): "Up",
-        }
+        # Traversable (road, destination or traffic light) and not against the road
+        return self.model.cell_index.can_enter(current, neighbor)
 
-        cell_contents = self.model.grid.get_cell_list_contents([neighbor])
+    def _walled_in(self) -> bool:
+        """True while every wall of the last failed repair is still occupied"""
+        return self.blocked_by is not None and all(
+            self._is_cell_blocked(cell) for cell in self.blocked_by
+        )
 
-        # Check if there's a road going in the wrong direction
-        for agent in cell_contents:
-            if isinstance(agent, Road) and agent.direction == direction_map.get(
-                intended_direction, ""
-            ):
-                return False
+    def replan(self) -> bool:
+        """Repair the path around the cars blocking it, see PathFinder.repair.
+
+        The destination's distance field guides the repair only if the
+        model already holds it; none is built here. Without a path, the
+        car's static route down that field is repaired instead, and with
+        no field either the car just retries the full search next step. A
+        repair that failed is only retried once one of the cells that
+        walled it in is free, since until then it would fail the same way.
+        """
+        if self._walled_in():
+            return False
 
-        # Check if the cell is traversable (contains road, destination, or traffic light)
-        if not any(
-            isinstance(agent, (Road, Destination, Traffic_Light))
-            for agent in cell_contents
-        ):
+        model = self.model
+        distances = model.distance_fields.get(self.destination.pos)
+        if not self.path and distances is None:
             return False
 
+        finder = model.path_finder
+        height = model.height
+        start = self.pos[0] * height + self.pos[1]
+        if self.path:
+            cells = [x * height + y for x, y in self.path]
+        else:
+            cells = finder.route(start, distances)
+        repaired, self.blocked_by = finder.repair(
+            start, cells, self._is_cell_blocked, distances
+        )
+        if not repaired:
+            return False
+        self.path = [(finder.xs[cell], finder.ys[cell]) for cell in repaired]
         return True
 
-    def _is_better_path(
-        self, neighbor: Tuple[int, int], g_score: int, open_set: List
-    ) -> bool:
-        """Check if this path to neighbor is better than existing ones."""
-        return not any(item[2] == neighbor and g_score >= item[1] for item in open_set)
-
-    def find_alternate_path(self):
-        """Find an alternate path when stuck."""
-        return self.find_path()
+    def _replan_when_patient(self):
+        """Replan every REPLAN_PATIENCE blocked steps rather than every step"""
+        if self.stuck_counter >= REPLAN_PATIENCE:
+            self.stuck_counter = 0
+            self.replan()
 
     ###################
     # MAIN MOVEMENT AND STEP FUNCTIONS
@@ -259,8 +236,14 @@ class Car(Agent):
         if self._handle_destination_arrival():
             return
 
+        if self.model.routing == "field":
+            self._move_along_field()
+            return
+
         if not self.path:
-            self.path = self.find_path()
+            # A full search fails wherever a local repair did
+            if not self._walled_in():
+                self.path = self.find_path()
             if not self.path:
                 self._handle_no_path()
                 return
@@ -272,21 +255,10 @@ class Car(Agent):
         """Handle arrival at destination."""
         if self.destination and self.pos == self.destination.pos:
             self.state = "arrived"
-            self.model.grid.remove_agent(self)
-            self.model.schedule.remove(self)
+            self.model.remove_car(self)
             self.model.reached_destination += 1
-
-            if (
-                len(
-                    [
-                        agent
-                        for agent in self.model.schedule.agents
-                        if isinstance(agent, Car)
-                    ]
-                )
-                < self.model.num_agents
-            ):
-                self.model.add_new_car()
+            # Replaced in the model's spawning stage
+            self.model.pending_spawns += 1
             return True
         return False
 
@@ -294,35 +266,69 @@ class Car(Agent):
         """Handle situation when no path is found."""
         self.state = "stopped"
         self.stuck_counter += 1
-        if self.stuck_counter > 15:
-            self.path = self.find_alternate_path()
-            self.stuck_counter = 0
+        if self.model.routing == "astar" and self.destination:
+            self._replan_when_patient()
 
     def _attempt_move(self) -> bool:
         """Attempt to move to next position in path."""
         if not self.path:
             return False
 
-        next_move = self.path[0]
+        if not self._move_to(self.path[0]):
+            return False
+
+        self.path.pop(0)
+        return True
+
+    def _move_to(self, next_move: Tuple[int, int]) -> bool:
+        """Move to an adjacent cell if it is free and its light is green."""
         if self._check_collision(next_move) or not self._get_traffic_light_state(
             next_move
         ):
             return False
 
-        self.model.grid.move_agent(self, next_move)
+        self.model.move_car(self, next_move)
         self.state = "moving"
-        self.path.pop(0)
         self.stuck_counter = 0
+        self.blocked_by = None
         self.last_position = self.pos
         return True
 
+    def _move_along_field(self):
+        """Follow the destination's distance field one cell at a time.
+
+        When the best neighbor is taken by another car, fall back to the
+        best free neighbor that does not lead away from the destination.
+        """
+        if self.destination is None:
+            self._handle_no_path()
+            return
+
+        next_move = self.model.next_hop(self.pos, self.destination.pos)
+        if next_move is None:
+            self._handle_no_path()
+            return
+
+        if self._check_collision(next_move):
+            next_move = self.model.next_hop(
+                self.pos, self.destination.pos, self._is_cell_blocked
+            )
+
+        if next_move is None or not self._move_to(next_move):
+            self.state = "stopped"
+            self.stuck_counter += 1
+
     def _handle_blocked_movement(self):
-        """Handle situation when movement is blocked."""
+        """Handle situation when movement is blocked.
+
+        Red lights are waited out; a car in the way triggers a repair
+        after REPLAN_PATIENCE blocked steps, and again every
+        REPLAN_PATIENCE steps for as long as it stays in the way.
+        """
         self.state = "stopped"
         self.stuck_counter += 1
-        if self.stuck_counter > 15:
-            self.path = self.find_alternate_path()
-            self.stuck_counter = 0
+        if self._check_collision(self.path[0]):
+            self._replan_when_patient()
 
     def step(self):
         """Mesa model step function"""
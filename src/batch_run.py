@@ -0,0 +1,241 @@
+# src/batch_run.py
+"""Headless batch runs of CityModel across a process pool.
+
+Runs M independently seeded simulations for S steps each and writes the
+DataCollector series plus a per-run throughput summary. Only the model
+package is imported: no Flask and none of our visualization servers.
+
+    python -m src.batch_run --runs 8 --steps 500 --agents 100 --workers 4
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.model.city_model import CityModel, ENGINES, ROUTING_MODES
+from src.model.map_generator import generated_map
+from src.model.snapshot import Snapshot
+from src.model.static_map import load_static_map
+
+OUTPUT_FORMATS = ("csv", "parquet")
+
+
+def checkpoint_path(checkpoint_dir, run):
+    return os.path.join(checkpoint_dir, f"run_{run}.snapshot")
+
+
+def load_checkpoint(path, **expected):
+    """Snapshot at path, if it was taken from a run with the expected arguments"""
+    snapshot = Snapshot.load(path)
+    found = {
+        "agents": snapshot.num_agents,
+        "seed": snapshot.seed,
+        "map_file": snapshot.map_file,
+        "engine": snapshot.engine,
+    }
+    mismatched = [name for name in expected if found[name] != expected[name]]
+    if mismatched:
+        raise ValueError(
+            f"Checkpoint {path} is of another run: "
+            + ", ".join(
+                f"{name} {found[name]!r} != {expected[name]!r}" for name in mismatched
+            )
+        )
+    return snapshot
+
+
+def save_checkpoint(model, path):
+    """Snapshot the model to path, never leaving a partly written file there"""
+    temporary = path + ".tmp"
+    model.snapshot().save(temporary)
+    os.replace(temporary, path)
+
+
+def run_simulation(
+    run,
+    seed,
+    agents,
+    steps,
+    map_file,
+    routing,
+    engine="agents",
+    checkpoint_every=None,
+    checkpoint_dir=None,
+):
+    """Run one seeded simulation and return its series and summary rows.
+
+    With checkpoint_dir, the run is saved there every checkpoint_every
+    steps and picks up from its last checkpoint when one exists. A
+    checkpoint taken with other agents, seed, map or engine raises
+    ValueError.
+    """
+    path = checkpoint_path(checkpoint_dir, run) if checkpoint_dir else None
+    started = time.perf_counter()
+    if path and os.path.exists(path):
+        snapshot = load_checkpoint(
+            path, agents=agents, seed=seed, map_file=map_file, engine=engine
+        )
+        model = CityModel.from_snapshot(snapshot)
+    else:
+        model = CityModel(
+            agents, map_file=map_file, routing=routing, seed=seed, engine=engine
+        )
+    init_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    remaining = steps - model.schedule.steps
+    for _ in range(remaining):
+        model.step()
+        if path and checkpoint_every and model.schedule.steps % checkpoint_every == 0:
+            save_checkpoint(model, path)
+    wall_time = time.perf_counter() - started
+
+    model_vars = model.datacollector.model_vars
+    series = []
+    for step, values in enumerate(zip(*model_vars.values())):
+        row = {"run": run, "seed": seed, "step": step}
+        row.update(zip(model_vars, values))
+        series.append(row)
+    summary = {
+        "run": run,
+        "seed": seed,
+        "agents": agents,
+        "steps": steps,
+        "routing": model.routing,
+        "engine": engine,
+        "reached_destination": model.reached_destination,
+        "arrived_per_step": model.reached_destination / steps if steps else 0,
+        "init_time_s": init_time,
+        "wall_time_s": wall_time,
+        "wall_time_per_step_ms": wall_time / remaining * 1e3 if remaining > 0 else 0,
+    }
+    for stage, seconds in model.schedule.total_stage_times.items():
+        summary[f"{stage}_time_s"] = seconds
+    return series, summary
+
+
+def write_rows(rows, path, output_format):
+    if output_format == "parquet":
+        try:
+            import pandas as pd
+
+            pd.DataFrame(rows).to_parquet(path, index=False)
+        except ImportError as e:
+            raise SystemExit(f"Parquet output needs pandas and pyarrow: {e}")
+        return
+
+    with open(path, "w", newline="") as out:
+        writer = csv.DictWriter(out, fieldnames=list(rows[0]) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_batch(
+    runs,
+    steps,
+    agents,
+    seed=0,
+    workers=None,
+    map_file="city_files/2022_base.txt",
+    routing=None,
+    engine="agents",
+    checkpoint_every=None,
+    checkpoint_dir=None,
+):
+    """Run every simulation and return (series rows, summary rows) by run"""
+    series, summaries = [], []
+    # Parsed before the pool starts, so forked workers inherit the cache
+    load_static_map(map_file)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                run_simulation,
+                run,
+                seed + run,
+                agents,
+                steps,
+                map_file,
+                routing,
+                engine,
+                checkpoint_every,
+                checkpoint_dir,
+            )
+            for run in range(runs)
+        ]
+        for future in futures:
+            run_series, summary = future.result()
+            series.extend(run_series)
+            summaries.append(summary)
+    return series, summaries
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless CityModel batch runs")
+    parser.add_argument("--runs", type=int, default=4, help="simulations (M)")
+    parser.add_argument("--steps", type=int, default=500, help="steps per run (S)")
+    parser.add_argument("--agents", type=int, default=100, help="N for CityModel")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run")
+    parser.add_argument("--workers", type=int, default=None, help="pool size")
+    maps = parser.add_mutually_exclusive_group()
+    maps.add_argument("--map", dest="map_file", default="city_files/2022_base.txt")
+    maps.add_argument(
+        "--map-size", type=int, default=None, help="use a generated square map"
+    )
+    parser.add_argument(
+        "--routing", choices=ROUTING_MODES, default=None, help="default per engine"
+    )
+    parser.add_argument("--engine", choices=ENGINES, default="agents")
+    parser.add_argument(
+        "--checkpoint-every", type=int, default=None, help="steps between snapshots"
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        default=None,
+        help="save snapshots here and resume runs from them",
+    )
+    parser.add_argument("--output-dir", default="batch_results")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.map_size is not None:
+        args.map_file = generated_map(args.map_size)
+    started = time.perf_counter()
+    series, summaries = run_batch(
+        args.runs,
+        args.steps,
+        args.agents,
+        seed=args.seed,
+        workers=args.workers,
+        map_file=args.map_file,
+        routing=args.routing,
+        engine=args.engine,
+        checkpoint_every=args.checkpoint_every,
+        checkpoint_dir=args.checkpoint_dir,
+    )
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, rows in (("series", series), ("summary", summaries)):
+        path = os.path.join(args.output_dir, f"{name}.{args.format}")
+        write_rows(rows, path, args.format)
+
+    for summary in summaries:
+        print(
+            f"run {summary['run']} (seed {summary['seed']}): "
+            f"{summary['reached_destination']} arrived, "
+            f"{summary['arrived_per_step']:.3f} per step, "
+            f"{summary['wall_time_per_step_ms']:.2f} ms per step"
+        )
+    print(
+        f"{args.runs} runs x {args.steps} steps in "
+        f"{time.perf_counter() - started:.1f}s -> {args.output_dir}"
+    )
+
+
+if __name__ == "__main__":
+    main()
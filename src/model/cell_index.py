@@ -0,0 +1,119 @@
+# src/model/cell_index.py
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Cell kinds, one per map character class
+EMPTY = 0
+ROAD = 1
+TRAFFIC_LIGHT = 2
+OBSTACLE = 3
+DESTINATION = 4
+
+# Map characters by cell kind
+KIND_CHARS = {
+    ROAD: "v^><",
+    TRAFFIC_LIGHT: "Ss",
+    OBSTACLE: "#",
+    DESTINATION: "D",
+}
+
+# Road directions are stored as small codes; 0 means no road
+DIRECTIONS = (None, "Up", "Down", "Left", "Right")
+
+# A move is rejected when the target road points straight back at the car
+OPPOSING_DIRECTIONS = {
+    (1, 0): "Left",
+    (-1, 0): "Right",
+    (0, 1): "Down",
+    (0, -1): "Up",
+}
+
+
+class CellIndex:
+    """Static lookup tables for the city map, filled once while loading.
+
+    Cells are addressed by the flat id ``x * height + y``, which orders ids
+    the same way as ``(x, y)`` tuples. Only map content that never changes
+    lives here; cars are still tracked by the grid. Kinds and road
+    directions take one byte per cell, so roads and obstacles need no
+    agent objects.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        size = width * height
+        self.kinds = bytearray(size)
+        self.directions = bytearray(size)
+        self.lights = {}
+
+    ###################
+    # REGISTRATION
+    ###################
+
+    def cell_id(self, pos: Tuple[int, int]) -> int:
+        return pos[0] * self.height + pos[1]
+
+    def load_rows(self, rows: List[str], map_dictionary: dict):
+        """Fill kinds and road directions from map rows, top row first"""
+        chars = np.frombuffer(
+            "".join(row[: self.width] for row in rows).encode("ascii"), np.uint8
+        ).reshape(self.height, self.width)
+        kind_table = np.zeros(256, dtype=np.uint8)
+        for kind, symbols in KIND_CHARS.items():
+            kind_table[[ord(symbol) for symbol in symbols]] = kind
+        direction_table = np.zeros(256, dtype=np.uint8)
+        for symbol in KIND_CHARS[ROAD]:
+            direction_table[ord(symbol)] = DIRECTIONS.index(map_dictionary[symbol])
+
+        # Row r holds y = height - r - 1; ids run over x first, then y
+        by_cell = chars[::-1].T.ravel()
+        self.kinds = bytearray(kind_table[by_cell].tobytes())
+        self.directions = bytearray(direction_table[by_cell].tobytes())
+
+    def add_traffic_light(self, pos, light):
+        """Kinds already mark the cell; this only links the light agent"""
+        self.lights[self.cell_id(pos)] = light
+
+    # END REGISTRATION
+
+    ###################
+    # LOOKUPS
+    ###################
+
+    def kind_at(self, pos: Tuple[int, int]) -> int:
+        return self.kinds[pos[0] * self.height + pos[1]]
+
+    def is_drivable(self, pos: Tuple[int, int]) -> bool:
+        """Road or traffic light, the cells a car may drive along"""
+        kind = self.kinds[pos[0] * self.height + pos[1]]
+        return kind == ROAD or kind == TRAFFIC_LIGHT
+
+    def is_destination(self, pos: Tuple[int, int]) -> bool:
+        return self.kinds[pos[0] * self.height + pos[1]] == DESTINATION
+
+    def is_road(self, pos: Tuple[int, int]) -> bool:
+        return self.kinds[pos[0] * self.height + pos[1]] == ROAD
+
+    def direction_at(self, pos: Tuple[int, int]) -> Optional[str]:
+        """Direction of the road at pos, None anywhere else"""
+        return DIRECTIONS[self.directions[pos[0] * self.height + pos[1]]]
+
+    def light_at(self, pos: Tuple[int, int]):
+        return self.lights.get(pos[0] * self.height + pos[1])
+
+    def can_enter(
+        self, current: Tuple[int, int], neighbor: Tuple[int, int]
+    ) -> bool:
+        """Static part of a move check: traversable and not against the road."""
+        cell = neighbor[0] * self.height + neighbor[1]
+        kind = self.kinds[cell]
+        if kind == ROAD:
+            opposing = OPPOSING_DIRECTIONS.get(
+                (neighbor[0] - current[0], neighbor[1] - current[1])
+            )
+            return DIRECTIONS[self.directions[cell]] != opposing
+        return kind == TRAFFIC_LIGHT or kind == DESTINATION
+
+    # END LOOKUPS
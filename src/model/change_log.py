@@ -0,0 +1,60 @@
+# src/model/change_log.py
+from collections import deque
+
+# Steps of history kept for delta /state requests
+CHANGE_LOG_STEPS = 256
+
+
+class ChangeLog:
+    """What changed on the map in each recent step.
+
+    Cars are recorded by unique id with their new position, or None once
+    they leave the map; traffic lights by unique id with their new state.
+    Changes made between two commits belong to the later step.
+    """
+
+    def __init__(self, max_steps=CHANGE_LOG_STEPS):
+        self.entries = deque(maxlen=max_steps)
+        self.cars = {}
+        self.lights = {}
+        self.step = 0
+        # Earliest step a delta can still be built from
+        self.oldest = 0
+
+    def car(self, unique_id, pos):
+        self.cars[unique_id] = pos
+
+    def light(self, unique_id, state):
+        self.lights[unique_id] = state
+
+    def commit(self, step):
+        """Close the changes of `step`"""
+        if len(self.entries) == self.entries.maxlen:
+            self.oldest = self.entries[0][0]
+        self.entries.append((step, self.cars, self.lights))
+        self.cars = {}
+        self.lights = {}
+        self.step = step
+
+    def since(self, step):
+        """(cars, lights) changed after `step`, latest value per id.
+
+        Returns None when the log no longer covers every step after `step`,
+        or when `step` is ahead of the model.
+        """
+        if step < self.oldest or step > self.step:
+            return None
+        cars, lights = {}, {}
+        for entry_step, entry_cars, entry_lights in self.entries:
+            if entry_step > step:
+                cars.update(entry_cars)
+                lights.update(entry_lights)
+        return cars, lights
+
+    def reset(self, step):
+        """Forget all history, as after restoring the model to `step`"""
+        self.entries.clear()
+        self.cars = {}
+        self.lights = {}
+        self.step = step
+        self.oldest = step
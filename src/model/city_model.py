@@ -1,26 +1,81 @@
 # src/model/city_model.py
 from mesa import Model
-from mesa.time import RandomActivation
 from mesa.datacollection import DataCollector
-from mesa.space import MultiGrid
 from ..agents.car import Car
 from ..agents.road import Road
 from ..agents.traffic_light import Traffic_Light
 from ..agents.destination import Destination
 from ..agents.obstacle import Obstacle
-import json
+from .cell_index import OBSTACLE, ROAD
+from .change_log import ChangeLog
+from .scheduler import CityScheduler
+from .snapshot import Snapshot
+from .static_map import load_static_map
+from .sparse_grid import SparseMultiGrid
+from .intersections import PhaseWheel, build_intersection_controllers
+from .vector_engine import VectorCarEngine
+from collections import OrderedDict
+import numpy as np
+import re
+
+ROUTING_MODES = ("astar", "field")
+# Memory for cached distance fields when max_distance_fields is not given
+DISTANCE_FIELD_BUDGET = 256 * 2**20
+ENGINES = ("agents", "vectorized")
+# Map characters that still become agents; the rest live in cell_index
+AGENT_CHARS = re.compile("[SsD]")
 
 
 class CityModel(Model):
-    def __init__(self, N):
+    def __init__(
+        self,
+        N,
+        map_file="city_files/2022_base.txt",
+        routing=None,
+        max_distance_fields=None,
+        seed=None,
+        engine="agents",
+        static_map=None,
+    ):
+        # seed is consumed by mesa.Model.__new__, which seeds self.random
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine!r}")
+        # The vectorized engine always follows distance fields
+        if routing is None:
+            routing = "field" if engine == "vectorized" else "astar"
+        if routing not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode: {routing!r}")
+        if engine == "vectorized" and routing != "field":
+            raise ValueError("The vectorized engine only supports field routing")
         self.num_agents = N
+        if static_map is not None:
+            map_file = static_map.map_file
+        self.map_file = map_file
+        self.static_map = static_map
+        self.routing = routing
+        self.engine = engine
+        self.car_engine = None
+        self.max_distance_fields = max_distance_fields
+        self.distance_fields = OrderedDict()
+        self._next_car_index = 0
         self.current_agents = 0
         self.reached_destination = 0
         self.spawn_delay = 10
         self.steps_since_spawn = 0
+        # Arrivals of the current step, replaced in the spawning stage
+        self.pending_spawns = 0
+        self.cars = {}
+        # Running aggregates over self.cars for the reporters
+        self.speed_sum = 0
+        self.stopped_cars = 0
         self.traffic_lights = []
+        self.destinations = []
+        # Road and Obstacle objects built on demand for visualization
+        self.static_agents = {}
+        self.change_log = ChangeLog()
         self.initialize_model()
         self.initialize_data_collector()
+        self.change_log.commit(self.schedule.steps)
         self.running = True
 
     ###################
@@ -31,29 +86,43 @@ class CityModel(Model):
         self.load_map_data()
         self.create_grid()
         self.create_agents()
+        # Same order as grid.coord_iter(), so destination draws are unchanged
+        self.destinations.sort(key=lambda destination: destination.pos)
+        self.intersection_controllers = build_intersection_controllers(
+            self.traffic_lights
+        )
+        # Lights are switched here instead of being scheduled agents
+        self.phase_wheel = PhaseWheel(self.intersection_controllers)
+        self.path_finder = self.static_map.path_finder(self.cell_index)
+        if self.max_distance_fields is None:
+            # One int32 per cell and field
+            self.max_distance_fields = max(
+                1, DISTANCE_FIELD_BUDGET // (4 * self.width * self.height)
+            )
+        if self.engine == "vectorized":
+            self.car_engine = VectorCarEngine(self)
         self.spawn_initial_cars()
 
     def load_map_data(self):
-        self.map_dictionary = json.load(open("static/city_files/mapDictionary.json"))
-        with open("city_files/2022_base.txt") as baseFile:
-            self.map_lines = baseFile.readlines()
-            self.width = len(self.map_lines[0]) - 1
-            self.height = len(self.map_lines)
-            self.grid = MultiGrid(self.width, self.height, torus=False)
-            self.schedule = RandomActivation(self)
+        """Take the parsed map from the process-wide cache, unless one was given"""
+        if self.static_map is None:
+            self.static_map = load_static_map(self.map_file)
+        static_map = self.static_map
+        self.map_dictionary = static_map.map_dictionary
+        self.map_lines = static_map.map_lines
+        self.width = static_map.width
+        self.height = static_map.height
+        self.grid = SparseMultiGrid(self.width, self.height, torus=False)
+        self.schedule = CityScheduler(self)
+        self.cell_index = static_map.cell_index()
+        # Car index per cell id (x * height + y), -1 when the cell is free
+        self.occupancy = np.full(self.width * self.height, -1, dtype=np.int32)
 
     def create_grid(self):
-        traffic_light_positions = self.collect_traffic_light_positions()
-        self.paired_lights = self.pair_traffic_lights(traffic_light_positions)
-
-    def collect_traffic_light_positions(self):
-        positions = []
-        for r, row in enumerate(self.map_lines):
-            for c, col in enumerate(row):
-                if col in ["S", "s"]:
-                    pos = (c, self.height - r - 1)
-                    positions.append((pos, col))
-        return positions
+        """Light pairs, orientations and crossings come with the static map"""
+        self.paired_lights = self.static_map.paired_lights
+        self.pair_orientations = self.static_map.pair_orientations
+        self.neighbor_pairs = self.static_map.neighbor_pairs
 
     # END MAP INITIALIZATION
 
@@ -62,26 +131,19 @@ class CityModel(Model):
     ###################
 
     def create_agents(self):
+        """Traffic lights and destinations; roads and obstacles stay in cell_index"""
         for r, row in enumerate(self.map_lines):
-            for c, col in enumerate(row):
-                self.create_agent_at_position(r, c, col)
+            for match in AGENT_CHARS.finditer(row):
+                self.create_agent_at_position(r, match.start(), match.group())
 
     def create_agent_at_position(self, r, c, col):
         pos = (c, self.height - r - 1)
 
-        if col in ["v", "^", ">", "<"]:
-            self.create_road(r, c, pos, col)
-        elif col in ["S", "s"]:
+        if col in ["S", "s"]:
             self.create_traffic_light(r, c, pos, col)
-        elif col == "#":
-            self.create_obstacle(r, c, pos)
         elif col == "D":
             self.create_destination(r, c, pos)
 
-    def create_road(self, r, c, pos, col):
-        agent = Road(f"r_{r*self.width+c}", self, self.map_dictionary[col])
-        self.grid.place_agent(agent, pos)
-
     def create_traffic_light(self, r, c, pos, col):
         pair_id = self.paired_lights.get((pos, col))
         agent = Traffic_Light(
@@ -92,64 +154,72 @@ class CityModel(Model):
             pair_id=pair_id,
         )
         self.grid.place_agent(agent, pos)
+        self.cell_index.add_traffic_light(pos, agent)
         agent.post_init()
-        self.schedule.add(agent)
         self.traffic_lights.append(agent)
 
-    def create_obstacle(self, r, c, pos):
-        agent = Obstacle(f"ob_{r*self.width+c}", self)
-        self.grid.place_agent(agent, pos)
-
     def create_destination(self, r, c, pos):
         agent = Destination(f"d_{r*self.width+c}", self)
         self.grid.place_agent(agent, pos)
-        self.schedule.add(agent)
+        self.destinations.append(agent)
+
+    def static_agent_at(self, pos):
+        """Road or Obstacle object for pos, built on first request.
+
+        These are never placed on the grid or scheduled; they only give the
+        visualization something to portray.
+        """
+        cell = self.cell_index.cell_id(pos)
+        agent = self.static_agents.get(cell)
+        if agent is None:
+            kind = self.cell_index.kinds[cell]
+            # Same ids the map loader used to give these agents
+            r, c = self.height - pos[1] - 1, pos[0]
+            if kind == ROAD:
+                agent = Road(
+                    f"r_{r*self.width+c}", self, self.cell_index.direction_at(pos)
+                )
+            elif kind == OBSTACLE:
+                agent = Obstacle(f"ob_{r*self.width+c}", self)
+            else:
+                return None
+            agent.pos = pos
+            self.static_agents[cell] = agent
+        return agent
 
     # END AGENT CREATION
 
     ###################
-    # TRAFFIC LIGHT MANAGEMENT
+    # ROUTING
     ###################
 
-    def pair_traffic_lights(self, positions):
-        paired_lights = {}
-        remaining_positions = positions.copy()
-        pair_id = 1
-
-        while remaining_positions:
-            pos1, col1 = remaining_positions.pop(0)
-            closest_pair = None
-            min_distance = float("inf")
-
-            for i, (pos2, col2) in enumerate(remaining_positions):
-                dx = abs(pos1[0] - pos2[0])
-                dy = abs(pos1[1] - pos2[1])
-
-                if (dx == 0 and dy == 1) or (dy == 0 and dx == 1):
-                    dist = dx + dy
-                    if dist < min_distance:
-                        min_distance = dist
-                        closest_pair = i
-
-            if closest_pair is not None:
-                pos2, col2 = remaining_positions.pop(closest_pair)
-                paired_lights[pos1, col1] = pair_id
-                paired_lights[pos2, col2] = pair_id
-
-                is_horizontal = pos1[1] == pos2[1]
-                self.pair_orientations = getattr(self, "pair_orientations", {})
-                self.pair_orientations[pair_id] = (
-                    "horizontal" if is_horizontal else "vertical"
-                )
-
-                pair_id += 1
-            else:
-                paired_lights[pos1, col1] = pair_id
-                pair_id += 1
-
-        return paired_lights
-
-    # END TRAFFIC LIGHT MANAGEMENT
+    def distance_field(self, goal):
+        """Steps to goal from every cell id, computed on first use (LRU-bounded)"""
+        field = self.distance_fields.get(goal)
+        if field is None:
+            field = self.path_finder.distance_field(self.cell_index.cell_id(goal))
+            self.distance_fields[goal] = field
+            if len(self.distance_fields) > self.max_distance_fields:
+                self.distance_fields.popitem(last=False)
+        else:
+            self.distance_fields.move_to_end(goal)
+        return field
+
+    def next_hop(self, pos, goal, is_blocked=None):
+        """Neighbor of pos closest to goal, or None when goal is unreachable.
+
+        With is_blocked, occupied neighbors are skipped and only moves that
+        do not take the car farther from goal are considered.
+        """
+        field = self.distance_field(goal)
+        cell = self.cell_index.cell_id(pos)
+        max_distance = field[cell] if is_blocked is not None else None
+        hop = self.path_finder.next_hop(cell, field, is_blocked, max_distance)
+        if hop is None:
+            return None
+        return (hop // self.height, hop % self.height)
+
+    # END ROUTING
 
     ###################
     # CAR SPAWNING AND MANAGEMENT
@@ -163,10 +233,7 @@ class CityModel(Model):
 
         initial_cars = min(len(spawn_points), self.num_agents)
         for i in range(initial_cars):
-            car = Car(f"car_{i}", self)
-            self.grid.place_agent(car, spawn_points[i % len(spawn_points)])
-            self.schedule.add(car)
-            self.current_agents += 1
+            self.spawn_car(spawn_points[i % len(spawn_points)])
 
     def find_spawn_points(self):
         corner_checks = [
@@ -179,41 +246,37 @@ class CityModel(Model):
         return [
             corner
             for corner in corner_checks
-            if any(
-                isinstance(obj, Road)
-                for obj in self.grid.get_cell_list_contents(corner)
-            )
+            if self.cell_index.is_road(corner)
         ]
 
     def add_new_car(self):
         """Add a new car to the simulation with unique ID"""
-        existing_cars = [
-            agent for agent in self.schedule.agents if isinstance(agent, Car)
-        ]
-
         if self.current_agents >= self.num_agents:
             return False
 
-        # Find the highest existing car ID and add 1
-        existing_ids = [int(car.unique_id.split("_")[1]) for car in existing_cars]
-        next_id = max(existing_ids) + 1 if existing_ids else 0
-
         max_attempts = 3
         for _ in range(max_attempts):
             spawn_point = self.find_valid_spawn_point()
-            if spawn_point:
-                car_id = f"car_{next_id}"
-                new_car = Car(car_id, self)
-
-                cell_contents = self.grid.get_cell_list_contents(spawn_point)
-                if not any(isinstance(agent, Car) for agent in cell_contents):
-                    self.grid.place_agent(new_car, spawn_point)
-                    self.schedule.add(new_car)
-                    self.current_agents += 1
-                    return True
+            if spawn_point and not self.is_occupied(spawn_point):
+                self.spawn_car(spawn_point)
+                return True
 
         return False
 
+    def spawn_car(self, pos):
+        """Create a car with the next unused id and put it on the map"""
+        index = self.next_car_index()
+        if self.car_engine is not None:
+            self.car_engine.add(index, pos)
+            self.current_agents += 1
+            return None
+
+        car = Car(f"car_{index}", self, index)
+        self.place_car(car, pos)
+        self.schedule.add(car)
+        self.current_agents += 1
+        return car
+
     def find_valid_spawn_point(self):
         corner_checks = [
             (0, self.height - 1),
@@ -222,49 +285,102 @@ class CityModel(Model):
             (0, 0),
         ]
 
-        valid_corners = []
-        for corner in corner_checks:
-            cell_contents = self.grid.get_cell_list_contents(corner)
-            if any(isinstance(obj, Road) for obj in cell_contents) and not any(
-                isinstance(obj, Car) for obj in cell_contents
-            ):
-                valid_corners.append(corner)
+        valid_corners = [
+            corner
+            for corner in corner_checks
+            if self.cell_index.is_road(corner)
+            and not self.is_occupied(corner)
+        ]
 
         if valid_corners:
-            best_corner = None
-            min_nearby_cars = float("inf")
-
-            for corner in valid_corners:
-                nearby_cars = 0
-                for dx, dy in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                    nearby_pos = (corner[0] + dx, corner[1] + dy)
-                    if (
-                        0 <= nearby_pos[0] < self.grid.width
-                        and 0 <= nearby_pos[1] < self.grid.height
-                    ):
-                        cell_contents = self.grid.get_cell_list_contents(nearby_pos)
-                        if any(isinstance(obj, Car) for obj in cell_contents):
-                            nearby_cars += 1
-
-                if nearby_cars < min_nearby_cars:
-                    min_nearby_cars = nearby_cars
-                    best_corner = corner
-
-            return best_corner
+            # Least crowded corner, the first one on ties
+            nearby_cars = self.count_cars_near(valid_corners, 1)
+            return valid_corners[int(np.argmin(nearby_cars))]
 
         for x in range(self.grid.width):
             for y in [0, self.height - 1]:
                 pos = (x, y)
-                cell_contents = self.grid.get_cell_list_contents(pos)
-                if any(isinstance(obj, Road) for obj in cell_contents) and not any(
-                    isinstance(obj, Car) for obj in cell_contents
-                ):
+                if self.cell_index.is_road(pos) and not self.is_occupied(pos):
                     return pos
 
         return None
 
+    def spawn_cars(self):
+        """Spawning stage: replace this step's arrivals, then the periodic spawn"""
+        for _ in range(self.pending_spawns):
+            if self.car_count < self.num_agents:
+                self.add_new_car()
+        self.pending_spawns = 0
+
+        self.steps_since_spawn += 1
+        if self.steps_since_spawn >= self.spawn_delay:
+            cars_to_add = min(self.num_agents - self.car_count, 3)
+            for _ in range(cars_to_add):
+                self.add_new_car()
+            self.steps_since_spawn = 0
+
     # END CAR SPAWNING AND MANAGEMENT
 
+    ###################
+    # CAR OCCUPANCY
+    ###################
+
+    def next_car_index(self):
+        """Monotonic car index, also used for car ids and the occupancy layer"""
+        index = self._next_car_index
+        self._next_car_index += 1
+        return index
+
+    def is_occupied(self, pos):
+        return self.occupancy[pos[0] * self.height + pos[1]] >= 0
+
+    def place_car(self, car, pos):
+        self.grid.place_agent(car, pos)
+        self.occupancy[pos[0] * self.height + pos[1]] = car.index
+        self.change_log.car(car.unique_id, pos)
+        self.cars[car.unique_id] = car
+        self.speed_sum += car.speed
+        if car.state == "stopped":
+            self.stopped_cars += 1
+
+    def move_car(self, car, pos):
+        self.occupancy[car.pos[0] * self.height + car.pos[1]] = -1
+        self.grid.move_agent(car, pos)
+        self.occupancy[pos[0] * self.height + pos[1]] = car.index
+        self.change_log.car(car.unique_id, pos)
+
+    def remove_car(self, car):
+        """Take a car off the map and out of the schedule"""
+        self.occupancy[car.pos[0] * self.height + car.pos[1]] = -1
+        self.change_log.car(car.unique_id, None)
+        self.grid.remove_agent(car)
+        self.schedule.remove(car)
+        del self.cars[car.unique_id]
+        self.speed_sum -= car.speed
+        if car.state == "stopped":
+            self.stopped_cars -= 1
+
+    def count_cars_near(self, points, k=1):
+        """Cars within Manhattan distance k of each point, the point excluded.
+
+        Runs as one batched query over the occupancy layer.
+        """
+        offsets = np.array(
+            [
+                (dx, dy)
+                for dx in range(-k, k + 1)
+                for dy in range(-k, k + 1)
+                if 0 < abs(dx) + abs(dy) <= k
+            ]
+        ).reshape(-1, 2)
+        cells = np.asarray(points).reshape(-1, 1, 2) + offsets
+        xs, ys = cells[..., 0], cells[..., 1]
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        ids = np.where(inside, xs * self.height + ys, 0)
+        return ((self.occupancy[ids] >= 0) & inside).sum(axis=1)
+
+    # END CAR OCCUPANCY
+
     ###################
     # DATA COLLECTION
     ###################
@@ -281,42 +397,66 @@ class CityModel(Model):
             }
         )
 
+    # Reporters read running counters kept by place_car, remove_car and Car.state
+
+    @property
+    def car_count(self):
+        if self.car_engine is not None:
+            return self.car_engine.count
+        return len(self.cars)
+
+    def iter_car_positions(self):
+        """(unique_id, (x, y)) of every car, whichever engine runs them"""
+        if self.car_engine is not None:
+            return self.car_engine.positions()
+        return ((car.unique_id, car.pos) for car in self.cars.values())
+
     def calculate_average_speed(self):
-        cars = [agent for agent in self.schedule.agents if isinstance(agent, Car)]
-        return sum(car.speed for car in cars) / len(cars) if cars else 0
+        car_count = self.car_count
+        return self.speed_sum / car_count if car_count else 0
 
     def calculate_traffic_density(self):
-        return len(
-            [agent for agent in self.schedule.agents if isinstance(agent, Car)]
-        ) / (self.grid.width * self.grid.height)
+        return self.car_count / (self.grid.width * self.grid.height)
 
     def count_stopped_cars(self):
-        return len(
-            [
-                agent
-                for agent in self.schedule.agents
-                if isinstance(agent, Car) and agent.state == "stopped"
-            ]
-        )
+        return self.stopped_cars
 
     # END DATA COLLECTION
 
     ###################
-    # MODEL STEPPING
+    # SNAPSHOTS
     ###################
 
-    def step(self):
-        """Mesa model step function"""
-        self.datacollector.collect(self)
-        self.steps_since_spawn += 1
+    def snapshot(self):
+        """Capture the running state, see Snapshot"""
+        return Snapshot(self)
+
+    def restore(self, snapshot):
+        """Return this model to a snapshot taken on a model of the same map"""
+        return snapshot.restore(self)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, static_map=None):
+        """Build a model for the snapshot's map and restore the snapshot into it"""
+        model = cls(
+            snapshot.num_agents,
+            map_file=snapshot.map_file,
+            routing=snapshot.routing,
+            engine=snapshot.engine,
+            static_map=static_map,
+        )
+        return model.restore(snapshot)
 
-        if self.steps_since_spawn >= self.spawn_delay:
-            current_cars = len(
-                [agent for agent in self.schedule.agents if isinstance(agent, Car)]
-            )
-            cars_to_add = min(self.num_agents - current_cars, 3)
-            for _ in range(cars_to_add):
-                self.add_new_car()
-            self.steps_since_spawn = 0
+    # END SNAPSHOTS
+
+    ###################
+    # MODEL STEPPING
+    ###################
+
+    def step(self, collect=True):
+        """Mesa model step function; collect=False skips the DataCollector.
 
-        self.schedule.step()
+        The stages and their order are defined by CityScheduler.
+        """
+        self.schedule.step(collect)
+        self.change_log.commit(self.schedule.steps)
@@ -0,0 +1,88 @@
+# src/model/intersections.py
+from collections import defaultdict
+
+
+class IntersectionController:
+    """Switches one traffic-light pair and the pairs that cross it.
+
+    Members and conflicting lights are resolved to direct references once,
+    so a phase change only touches the lights it actually sets.
+    """
+
+    def __init__(self, pair_id, members, conflicting):
+        self.pair_id = pair_id
+        self.members = members
+        self.conflicting = conflicting
+        # The pair member with the lowest id drives the phase changes
+        self.leader = min(members, key=lambda light: light.unique_id)
+        # Horizontal pairs change on multiples of timeToChange, vertical
+        # pairs half a period later
+        self.period = self.leader.timeToChange
+        self.offset = 0 if self.leader.orientation == "horizontal" else self.period // 2
+
+    def should_change(self, current_step):
+        return current_step % self.period == self.offset
+
+    def next_change(self, step):
+        """First step from `step` on where this pair changes"""
+        return step + (self.offset - step) % self.period
+
+    def toggle(self):
+        """Flip the pair and force the crossing pairs to the opposite state"""
+        new_state = not self.leader.state
+        for light in self.members:
+            light.state = new_state
+        for light in self.conflicting:
+            light.state = not new_state
+
+
+def build_intersection_controllers(traffic_lights):
+    """Compile one controller per pair and attach it to its member lights"""
+    lights_by_pair = defaultdict(list)
+    for light in traffic_lights:
+        lights_by_pair[light.pair_id].append(light)
+
+    controllers = []
+    for pair_id, members in lights_by_pair.items():
+        conflicting = [
+            light
+            for neighbor_id in members[0].get_neighboring_pairs()
+            for light in lights_by_pair[neighbor_id]
+        ]
+        controller = IntersectionController(pair_id, members, conflicting)
+        for light in members:
+            light.controller = controller
+        controllers.append(controller)
+    return controllers
+
+
+class PhaseWheel:
+    """Timing wheel of upcoming phase changes, one slot per step.
+
+    Each controller sits in the slot of the next step it changes on. The
+    wheel is as long as the longest period, so a rescheduled controller
+    never lands more than one turn ahead, and a step only touches the
+    controllers that are due. advance must be called for every step in
+    order; reset rebuilds the slots for any other starting step.
+    """
+
+    def __init__(self, controllers, step=0):
+        self.controllers = controllers
+        self.size = max((controller.period for controller in controllers), default=1)
+        self.reset(step)
+
+    def reset(self, step):
+        self.slots = [[] for _ in range(self.size)]
+        for i, controller in enumerate(self.controllers):
+            self.slots[controller.next_change(step) % self.size].append(i)
+
+    def advance(self, step):
+        """Toggle the controllers due at `step`, in map order, and reschedule them"""
+        slot = self.slots[step % self.size]
+        due = sorted(slot)
+        slot.clear()
+        for i in due:
+            controller = self.controllers[i]
+            controller.toggle()
+            self.slots[(step + controller.period) % self.size].append(i)
+        return len(due)
@@ -0,0 +1,144 @@
+# src/model/map_generator.py
+"""Synthetic city maps in the same character format as city_files/2022_base.txt.
+
+The city is a two-lane ring road around a grid of two-lane one-way streets
+whose directions alternate. Every approach into a crossing gets a pair of
+signals on its stop line ("S" on vertical streets, "s" on horizontal ones),
+and block cells next to a street become destinations ("D") with the given
+density. Everything else is an obstacle ("#").
+
+    python -m src.model.map_generator --width 200 --height 200 --out city.txt
+"""
+import argparse
+import os
+
+import numpy as np
+
+GENERATED_DIR = os.path.join("city_files", "generated")
+
+DOWN, UP, LEFT, RIGHT = (ord(c) for c in "v^<>")
+SIGNAL_VERTICAL, SIGNAL_HORIZONTAL = ord("S"), ord("s")
+OBSTACLE, DESTINATION = ord("#"), ord("D")
+ROAD_CHARS = (DOWN, UP, LEFT, RIGHT, SIGNAL_VERTICAL, SIGNAL_HORIZONTAL)
+
+
+def _street_offsets(size, block):
+    """First lane of each interior street, leaving room for the ring road"""
+    return list(range(block, size - block // 2 - 2, block))
+
+
+def generate_map(width, height, block=8, destination_density=0.1, seed=0):
+    """Return the map rows, top row first, without line endings"""
+    if block < 5:
+        raise ValueError("block must be at least 5 to fit signals between crossings")
+    if width < 2 * block or height < 2 * block:
+        raise ValueError(f"Map must be at least {2 * block}x{2 * block} cells")
+
+    cells = np.full((height, width), OBSTACLE, dtype=np.uint8)
+    columns = _street_offsets(width, block)
+    rows = _street_offsets(height, block)
+
+    # Interior streets, directions alternating; horizontal ones win crossings
+    for i, c in enumerate(columns):
+        cells[:, c : c + 2] = DOWN if i % 2 == 0 else UP
+    for i, r in enumerate(rows):
+        cells[r : r + 2, :] = LEFT if i % 2 == 0 else RIGHT
+
+    # Counter-clockwise ring road
+    cells[0:2, :] = LEFT
+    cells[-2:, :] = RIGHT
+    cells[:, 0:2] = DOWN
+    cells[:, -2:] = UP
+    cells[-2:, 0:2] = RIGHT
+    cells[0:2, -2:] = LEFT
+
+    _place_signals(cells, rows, columns)
+    _place_destinations(cells, destination_density, np.random.default_rng(seed))
+    return [row.tobytes().decode("ascii") for row in cells]
+
+
+def _place_signals(cells, rows, columns):
+    height, width = cells.shape
+    crossing_rows = [0] + rows + [height - 2]
+    crossing_columns = [0] + columns + [width - 2]
+
+    for c in columns:
+        heading_down = cells[2, c] == DOWN
+        for r in crossing_rows:
+            # Stop line one cell before the crossing, in the direction of travel
+            stop = r - 1 if heading_down else r + 2
+            if 0 < stop < height - 1 and cells[stop, c] in (DOWN, UP):
+                cells[stop, c : c + 2] = SIGNAL_VERTICAL
+
+    for r in rows:
+        heading_left = cells[r, 2] == LEFT
+        for c in crossing_columns:
+            stop = c + 2 if heading_left else c - 1
+            if 0 < stop < width - 1 and cells[r, stop] in (LEFT, RIGHT):
+                cells[r : r + 2, stop] = SIGNAL_HORIZONTAL
+
+    # The ring road stops before every interior street that joins it
+    for c in columns:
+        for r, stop in ((0, c + 2), (height - 2, c - 1)):
+            if cells[r, stop] in (LEFT, RIGHT):
+                cells[r : r + 2, stop] = SIGNAL_HORIZONTAL
+    for r in rows:
+        for c, stop in ((0, r - 1), (width - 2, r + 2)):
+            if cells[stop, c] in (DOWN, UP):
+                cells[stop, c : c + 2] = SIGNAL_VERTICAL
+
+
+def _place_destinations(cells, density, rng):
+    road = np.isin(cells, ROAD_CHARS)
+    next_to_road = np.zeros_like(road)
+    next_to_road[1:, :] |= road[:-1, :]
+    next_to_road[:-1, :] |= road[1:, :]
+    next_to_road[:, 1:] |= road[:, :-1]
+    next_to_road[:, :-1] |= road[:, 1:]
+    candidates = (cells == OBSTACLE) & next_to_road
+    cells[candidates & (rng.random(cells.shape) < density)] = DESTINATION
+
+
+def write_map(path, width, height, **options):
+    rows = generate_map(width, height, **options)
+    with open(path, "w") as out:
+        for row in rows:
+            out.write(row + "\n")
+    return path
+
+
+def generated_map(width, height=None, **options):
+    """Path to a generated map under city_files/generated, written on first use"""
+    height = height or width
+    suffix = "_".join(f"{key}{value}" for key, value in sorted(options.items()))
+    name = f"city_{width}x{height}{'_' + suffix if suffix else ''}.txt"
+    path = os.path.join(GENERATED_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(GENERATED_DIR, exist_ok=True)
+        write_map(path, width, height, **options)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic city map")
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--height", type=int, default=None)
+    parser.add_argument("--block", type=int, default=8, help="street spacing")
+    parser.add_argument("--destination-density", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    write_map(
+        args.out,
+        args.width,
+        args.height or args.width,
+        block=args.block,
+        destination_density=args.destination_density,
+        seed=args.seed,
+    )
+    print(f"Wrote {args.width}x{args.height or args.width} map to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# src/model/pathfinding.py
+from typing import Callable, List, Optional, Tuple
+from array import array
+from collections import deque
+import heapq
+
+# Distance-field value for cells that cannot reach the goal
+UNREACHABLE = -1
+# Cars farther than this (Manhattan) from a repairing car are not walls
+REPAIR_RADIUS = 6
+# Cells a repair may expand before giving up for this step
+REPAIR_BUDGET = 256
+
+
+class PathFinder:
+    """A* over the static road graph, shared by every car of a model.
+
+    Cells are integer ids from the CellIndex. Successor lists are compiled
+    once from the map, and the g-score and parent tables are reused across
+    searches: a generation stamp marks which entries belong to the current
+    search, so nothing is cleared or reallocated between calls.
+    """
+
+    def __init__(self, cell_index, topology=None):
+        self.cell_index = cell_index
+        self.height = cell_index.height
+        size = cell_index.width * cell_index.height
+        if topology is None:
+            self.xs = [cell // self.height for cell in range(size)]
+            self.ys = [cell % self.height for cell in range(size)]
+            self.successors = self._build_successors()
+            self.predecessors = self._build_predecessors()
+        else:
+            self.xs, self.ys, self.successors, self.predecessors = topology
+
+        self._generation = 0
+        self._seen = [0] * size
+        self._closed = [0] * size
+        self._g_score = [0] * size
+        self._parent = [0] * size
+
+    def topology(self):
+        """Coordinate and graph tables, read-only and shareable between models"""
+        return self.xs, self.ys, self.successors, self.predecessors
+
+    def _build_successors(self) -> List[Tuple[int, ...]]:
+        """Neighbors each cell may move into when no car is in the way."""
+        index = self.cell_index
+        successors = []
+        for cell in range(index.width * index.height):
+            x, y = self.xs[cell], self.ys[cell]
+            moves = []
+            for nx, ny in ((x, y + 1), (x + 1, y), (x, y - 1), (x - 1, y)):
+                if 0 <= nx < index.width and 0 <= ny < index.height:
+                    if index.can_enter((x, y), (nx, ny)):
+                        moves.append(nx * self.height + ny)
+            successors.append(tuple(sorted(moves)))
+        return successors
+
+    def _build_predecessors(self) -> List[Tuple[int, ...]]:
+        predecessors = [[] for _ in self.successors]
+        for cell, moves in enumerate(self.successors):
+            for neighbor in moves:
+                predecessors[neighbor].append(cell)
+        return [tuple(cells) for cells in predecessors]
+
+    def search(
+        self, start: int, goal: int, is_blocked: Callable[[int], bool]
+    ) -> List[int]:
+        """Return the cell ids after start up to goal, or [] if unreachable.
+
+        Ties are broken on (f, g, cell id), so routes match the previous
+        tuple-based implementation exactly.
+        """
+        self._generation += 1
+        generation = self._generation
+        seen, closed = self._seen, self._closed
+        g_score, parent = self._g_score, self._parent
+        successors, xs, ys = self.successors, self.xs, self.ys
+        goal_x, goal_y = xs[goal], ys[goal]
+
+        seen[start] = generation
+        g_score[start] = 0
+        open_set = [(abs(xs[start] - goal_x) + abs(ys[start] - goal_y), 0, start)]
+
+        while open_set:
+            _, g, current = heapq.heappop(open_set)
+
+            if current == goal:
+                return self._reconstruct(start, goal)
+
+            # Lazy deletion: stale heap entries of expanded cells are skipped
+            if closed[current] == generation:
+                continue
+            closed[current] = generation
+
+            tentative = g + 1
+            for neighbor in successors[current]:
+                if closed[neighbor] == generation:
+                    continue
+                if seen[neighbor] == generation and g_score[neighbor] <= tentative:
+                    continue
+                if is_blocked(neighbor):
+                    continue
+
+                seen[neighbor] = generation
+                g_score[neighbor] = tentative
+                parent[neighbor] = current
+                heapq.heappush(
+                    open_set,
+                    (
+                        tentative
+                        + abs(xs[neighbor] - goal_x)
+                        + abs(ys[neighbor] - goal_y),
+                        tentative,
+                        neighbor,
+                    ),
+                )
+
+        return []
+
+    def _reconstruct(self, start: int, goal: int) -> List[int]:
+        path = []
+        cell = goal
+        while cell != start:
+            path.append(cell)
+            cell = self._parent[cell]
+        path.reverse()
+        return path
+
+    def distance_field(self, goal: int) -> array:
+        """Steps from every cell to goal, ignoring cars (reverse BFS).
+
+        Stored as a compact int32 array that NumPy can view without copying.
+        """
+        distances = array("i", [UNREACHABLE]) * len(self.successors)
+        distances[goal] = 0
+        predecessors = self.predecessors
+        frontier = deque([goal])
+        while frontier:
+            cell = frontier.popleft()
+            step = distances[cell] + 1
+            for previous in predecessors[cell]:
+                if distances[previous] == UNREACHABLE:
+                    distances[previous] = step
+                    frontier.append(previous)
+        return distances
+
+    def next_hop(
+        self,
+        cell: int,
+        distances: array,
+        is_blocked: Optional[Callable[[int], bool]] = None,
+        max_distance: Optional[int] = None,
+    ) -> Optional[int]:
+        """Successor with the lowest distance, lowest cell id on ties.
+
+        With is_blocked, occupied successors are skipped; with max_distance,
+        successors farther from the goal than that are skipped.
+        """
+        best, best_distance = None, UNREACHABLE
+        for neighbor in self.successors[cell]:
+            distance = distances[neighbor]
+            if distance == UNREACHABLE:
+                continue
+            if max_distance is not None and distance > max_distance:
+                continue
+            if best is not None and distance >= best_distance:
+                continue
+            if is_blocked is not None and is_blocked(neighbor):
+                continue
+            best, best_distance = neighbor, distance
+        return best
+
+    def route(self, start: int, distances: array) -> List[int]:
+        """Cells after start down a distance field to its goal, ignoring cars"""
+        path = []
+        cell = start
+        if distances[cell] == UNREACHABLE:
+            return path
+        while distances[cell] != 0:
+            cell = self.next_hop(cell, distances)
+            path.append(cell)
+        return path
+
+    def repair(
+        self,
+        start: int,
+        path: List[int],
+        is_blocked: Callable[[int], bool],
+        distances: Optional[array] = None,
+        radius: int = REPAIR_RADIUS,
+        budget: int = REPAIR_BUDGET,
+    ) -> Tuple[Optional[List[int]], Optional[Tuple[int, ...]]]:
+        """Reroute the part of path (cell ids after start) that cars block.
+
+        Only cells within radius of start count as blocked: cars farther
+        ahead will have moved by the time this one gets there. The search
+        is A* from start and ends at the first free cell of the old path
+        past the blocked one, so the rest of the path is kept. Its
+        heuristic is the Manhattan distance to the path's goal, or the
+        goal's distance field when one is given, which is exact when no
+        car is in the way. Repairs never build a field themselves.
+
+        Returns (path, walls). path is None when no detour was found within
+        budget expansions. walls is set when the search failed for lack of
+        cells rather than budget: the blocked cells it ran into, none of
+        which must free up for the same repair to keep failing.
+        """
+        xs, ys = self.xs, self.ys
+        start_x, start_y = xs[start], ys[start]
+
+        def blocked(cell):
+            return (
+                abs(xs[cell] - start_x) + abs(ys[cell] - start_y) <= radius
+                and is_blocked(cell)
+            )
+
+        first = next((i for i, cell in enumerate(path) if blocked(cell)), None)
+        if first is None:
+            return path, None
+        # Blocked cells are never expanded, so every one popped here is free
+        rejoin = {cell: i for i, cell in enumerate(path[first + 1 :], first + 1)}
+        goal_x, goal_y = xs[path[-1]], ys[path[-1]]
+
+        def estimate(cell):
+            if distances is not None:
+                return distances[cell]
+            return abs(xs[cell] - goal_x) + abs(ys[cell] - goal_y)
+
+        self._generation += 1
+        generation = self._generation
+        seen, closed = self._seen, self._closed
+        g_score, parent = self._g_score, self._parent
+        successors = self.successors
+
+        seen[start] = generation
+        g_score[start] = 0
+        # Deepest cell first on ties, so the search runs toward the goal
+        open_set = [(estimate(start), 0, start)]
+        walls = set()
+        expanded = 0
+
+        while open_set:
+            _, negative_g, current = heapq.heappop(open_set)
+            if closed[current] == generation:
+                continue
+            closed[current] = generation
+
+            if current in rejoin:
+                return (
+                    self._reconstruct(start, current) + path[rejoin[current] + 1 :],
+                    None,
+                )
+            expanded += 1
+            if expanded > budget:
+                return None, None
+
+            tentative = 1 - negative_g
+            for neighbor in successors[current]:
+                if closed[neighbor] == generation:
+                    continue
+                if seen[neighbor] == generation and g_score[neighbor] <= tentative:
+                    continue
+                distance = estimate(neighbor)
+                if distance == UNREACHABLE:
+                    continue
+                if blocked(neighbor):
+                    walls.add(neighbor)
+                    continue
+
+                seen[neighbor] = generation
+                g_score[neighbor] = tentative
+                parent[neighbor] = current
+                heapq.heappush(
+                    open_set, (tentative + distance, -tentative, neighbor)
+                )
+
+        return None, tuple(sorted(walls))
+
+    def find_path(
+        self,
+        start: Tuple[int, int],
+        goal: Tuple[int, int],
+        is_blocked: Callable[[int], bool],
+    ) -> List[Tuple[int, int]]:
+        """Position-based wrapper around search()"""
+        height = self.height
+        cells = self.search(
+            start[0] * height + start[1], goal[0] * height + goal[1], is_blocked
+        )
+        return [(self.xs[cell], self.ys[cell]) for cell in cells]
@@ -0,0 +1,233 @@
+# src/model/snapshot.py
+import gzip
+import pickle
+
+import numpy as np
+
+from ..agents.car import Car
+
+# Bumped whenever the fields below change meaning
+SNAPSHOT_VERSION = 3
+CAR_STATES = ("moving", "stopped", "arrived")
+
+
+class Snapshot:
+    """Everything that changes while a CityModel runs, in flat arrays.
+
+    The map, the path finder and the light controllers are left out: they
+    are rebuilt from the map file and never change, so a snapshot can only
+    be restored into a model of the same map. Restoring only replaces the
+    cars and resets counters, which is far cheaper than building a model.
+
+    Cars are stored column-wise in the order of model.cars. Their paths are
+    concatenated into one array of cell ids, with path_lengths marking -1
+    for cars that have no path yet.
+    """
+
+    def __init__(self, model):
+        self.version = SNAPSHOT_VERSION
+        self.map_file = model.map_file
+        self.engine = model.engine
+        self.routing = model.routing
+        self.num_agents = model.num_agents
+        self.seed = model._seed
+        self.steps = model.schedule.steps
+        self.time = model.schedule.time
+        self.counters = {
+            name: getattr(model, name)
+            for name in (
+                "_next_car_index",
+                "current_agents",
+                "reached_destination",
+                "steps_since_spawn",
+                "speed_sum",
+                "stopped_cars",
+                "running",
+            )
+        }
+        self.rng_state = model.random.getstate()
+        self.light_states = np.fromiter(
+            (light.state for light in model.traffic_lights),
+            dtype=bool,
+            count=len(model.traffic_lights),
+        )
+        self.model_vars = {
+            name: list(values)
+            for name, values in model.datacollector.model_vars.items()
+        }
+        if model.car_engine is not None:
+            self._take_vector_cars(model.car_engine)
+        else:
+            self._take_agent_cars(model)
+
+    def _take_agent_cars(self, model):
+        cars = list(model.cars.values())
+        height = model.height
+        destination_index = {
+            destination.unique_id: i
+            for i, destination in enumerate(model.destinations)
+        }
+        self.car_indexes = np.array([car.index for car in cars], dtype=np.int64)
+        self.car_cells = np.array(
+            [car.pos[0] * height + car.pos[1] for car in cars], dtype=np.int64
+        )
+        self.car_destinations = np.array(
+            [
+                -1 if car.destination is None
+                else destination_index[car.destination.unique_id]
+                for car in cars
+            ],
+            dtype=np.int64,
+        )
+        self.car_states = np.array(
+            [CAR_STATES.index(car.state) for car in cars], dtype=np.int8
+        )
+        self.car_speeds = np.array([car.speed for car in cars], dtype=np.int64)
+        self.car_stuck = np.array([car.stuck_counter for car in cars], dtype=np.int64)
+        self.car_last_cells = np.array(
+            [
+                -1 if car.last_position is None
+                else car.last_position[0] * height + car.last_position[1]
+                for car in cars
+            ],
+            dtype=np.int64,
+        )
+        self.path_lengths = np.array(
+            [-1 if car.path is None else len(car.path) for car in cars],
+            dtype=np.int64,
+        )
+        self.path_cells = np.array(
+            [x * height + y for car in cars for x, y in car.path or ()],
+            dtype=np.int64,
+        )
+        # Activation order of every scheduled agent, which the shuffle depends on
+        self.schedule_order = [agent.unique_id for agent in model.schedule.agents]
+
+    def _take_vector_cars(self, engine):
+        self.car_indexes = engine.ids.copy()
+        self.car_cells = engine.cells.copy()
+        self.car_destinations = engine.destinations.copy()
+        self.car_states = engine.states.copy()
+        self.schedule_order = [
+            agent.unique_id for agent in engine.model.schedule.agents
+        ]
+
+    ###################
+    # PERSISTENCE
+    ###################
+
+    def save(self, path):
+        with gzip.open(path, "wb", compresslevel=1) as out:
+            pickle.dump(self, out, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        """Read a snapshot written by save. Only load files you wrote yourself."""
+        with gzip.open(path, "rb") as source:
+            snapshot = pickle.load(source)
+        if snapshot.version != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Snapshot version {snapshot.version} is not {SNAPSHOT_VERSION}"
+            )
+        return snapshot
+
+    # END PERSISTENCE
+
+    ###################
+    # RESTORE
+    ###################
+
+    def restore(self, model):
+        """Put model back in the snapshot's state.
+
+        Runs continue exactly as they would have from the moment the
+        snapshot was taken, with the same random draws.
+        """
+        if (model.map_file, model.engine, model.routing) != (
+            self.map_file,
+            self.engine,
+            self.routing,
+        ):
+            raise ValueError(
+                "Snapshot of a different map, engine or routing mode: "
+                f"{self.map_file!r}, {self.engine!r}, {self.routing!r}"
+            )
+
+        model.occupancy.fill(-1)
+        for car in model.cars.values():
+            model.grid.remove_agent(car)
+        model.cars = {}
+        for light, state in zip(model.traffic_lights, self.light_states.tolist()):
+            # Past changes are dropped from the change log below
+            light._state = state
+
+        if model.car_engine is not None:
+            self._restore_vector_cars(model.car_engine)
+            scheduled = {}
+        else:
+            scheduled = self._restore_agent_cars(model)
+
+        schedule = model.schedule
+        for agent in schedule.agents:
+            if agent.unique_id not in scheduled:
+                scheduled[agent.unique_id] = agent
+            schedule.remove(agent)
+        for unique_id in self.schedule_order:
+            schedule.add(scheduled[unique_id])
+        schedule.steps = self.steps
+        schedule.time = self.time
+        model.phase_wheel.reset(self.steps)
+
+        model.num_agents = self.num_agents
+        for name, value in self.counters.items():
+            setattr(model, name, value)
+        for name, values in self.model_vars.items():
+            model.datacollector.model_vars[name] = list(values)
+        model._seed = self.seed
+        model.random.setstate(self.rng_state)
+        model.change_log.reset(self.steps)
+        return model
+
+    def _restore_agent_cars(self, model):
+        height = model.height
+        paths = np.split(
+            self.path_cells, np.cumsum(np.maximum(self.path_lengths, 0))[:-1]
+        )
+        cars = {}
+        for i, index in enumerate(self.car_indexes.tolist()):
+            # Bypass Car.__init__, which would draw a destination
+            car = Car.__new__(Car)
+            car.unique_id = f"car_{index}"
+            car.model = model
+            car.pos = None
+            car.index = index
+            car._state = CAR_STATES[self.car_states[i]]
+            car.speed = int(self.car_speeds[i])
+            destination = int(self.car_destinations[i])
+            car.destination = (
+                model.destinations[destination] if destination >= 0 else None
+            )
+            car.stuck_counter = int(self.car_stuck[i])
+            # Only caches a failed repair, so it is safe to forget
+            car.blocked_by = None
+            last = int(self.car_last_cells[i])
+            car.last_position = None if last < 0 else (last // height, last % height)
+            car.path = (
+                None
+                if self.path_lengths[i] < 0
+                else [(cell // height, cell % height) for cell in paths[i].tolist()]
+            )
+            cell = int(self.car_cells[i])
+            model.grid.place_agent(car, (cell // height, cell % height))
+            model.occupancy[cell] = index
+            model.cars[car.unique_id] = car
+            cars[car.unique_id] = car
+        return cars
+
+    def _restore_vector_cars(self, engine):
+        engine.load(
+            self.car_indexes, self.car_cells, self.car_destinations, self.car_states
+        )
+        engine.model.occupancy[engine.cells] = engine.ids
+
+    # END RESTORE
@@ -0,0 +1,71 @@
+# src/model/sparse_grid.py
+import itertools
+
+from mesa.space import MultiGrid
+
+
+class _SparseColumn(dict):
+    """y -> agents of one grid column, holding only occupied cells.
+
+    Reading a cell that holds nothing returns a new empty list without
+    storing it, so lookups never grow the column.
+    """
+
+    __slots__ = ()
+
+    def __missing__(self, y):
+        return []
+
+
+class SparseMultiGrid(MultiGrid):
+    """MultiGrid that only allocates the cells that hold agents.
+
+    Mesa builds one list per cell up front, which dominates construction
+    time and memory on large maps once roads and obstacles are no longer
+    grid agents. Here each column is a _SparseColumn: reads such as
+    ``_grid[x][y]`` work unchanged for every MultiGrid method, while only
+    place_agent adds a cell and remove_agent drops it once it is empty.
+    Slices such as ``grid[x, :]`` are not supported.
+    """
+
+    def __init__(self, width: int, height: int, torus: bool) -> None:
+        # _Grid.__init__ of mesa 2.1.1 without its width * height cell
+        # lists, which are what this class avoids; keep in sync on upgrades
+        self.height = height
+        self.width = width
+        self.torus = torus
+        self.num_cells = height * width
+        self._grid = [_SparseColumn() for _ in range(width)]
+        self._empties_built = False
+        self._neighborhood_cache = {}
+        self.cutoff_empties = 7.953 * self.num_cells**0.384
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(
+            (column[y] for y in range(self.height)) for column in self._grid
+        )
+
+    def place_agent(self, agent, pos) -> None:
+        x, y = pos
+        cell = self._grid[x].setdefault(y, [])
+        if agent.pos is None or agent not in cell:
+            cell.append(agent)
+            agent.pos = pos
+            if self._empties_built:
+                self._empties.discard(pos)
+
+    def remove_agent(self, agent) -> None:
+        pos = agent.pos
+        x, y = pos
+        column = self._grid[x]
+        cell = column[y]
+        cell.remove(agent)
+        if not cell:
+            del column[y]
+            if self._empties_built:
+                self._empties.add(pos)
+        agent.pos = None
+
+    def is_cell_empty(self, pos) -> bool:
+        x, y = pos
+        return y not in self._grid[x]
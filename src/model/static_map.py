@@ -0,0 +1,168 @@
+# src/model/static_map.py
+import json
+import os
+import re
+import threading
+from types import MappingProxyType
+
+from .cell_index import CellIndex
+from .pathfinding import PathFinder
+
+MAP_DICTIONARY = "static/city_files/mapDictionary.json"
+LIGHT_CHARS = re.compile("[Ss]")
+
+# Parsed maps by file, see load_static_map
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class StaticMap:
+    """The parts of a city map that never change, parsed once per file.
+
+    Several CityModel instances of the same map can share one StaticMap:
+    each takes a CellIndex over the same read-only kind and direction
+    bytes and a PathFinder over the same road graph, and only keeps its
+    own agents, occupancy and search scratch tables. Traffic-light pairs
+    and their orientations are worked out here too, since they only
+    depend on where the lights are.
+
+    Everything is read-only (tuples, bytes and mapping proxies), so one
+    instance can be handed to any number of models and threads.
+    """
+
+    def __init__(self, map_file, dictionary_file=MAP_DICTIONARY):
+        self.map_file = map_file
+        with open(dictionary_file) as dictionary:
+            self.map_dictionary = MappingProxyType(json.load(dictionary))
+        with open(map_file) as baseFile:
+            self.map_lines = tuple(baseFile.readlines())
+        self.width = len(self.map_lines[0]) - 1
+        self.height = len(self.map_lines)
+
+        index = CellIndex(self.width, self.height)
+        index.load_rows(self.map_lines, self.map_dictionary)
+        self.kinds = bytes(index.kinds)
+        self.directions = bytes(index.directions)
+        self.topology = PathFinder(index).topology()
+
+        self.light_positions = tuple(self.collect_traffic_light_positions())
+        paired_lights, pair_orientations = pair_traffic_lights(self.light_positions)
+        self.paired_lights = MappingProxyType(paired_lights)
+        self.pair_orientations = MappingProxyType(pair_orientations)
+        self.neighbor_pairs = MappingProxyType(
+            find_neighbor_pairs(self.light_positions, paired_lights, pair_orientations)
+        )
+
+    def collect_traffic_light_positions(self):
+        """((x, y), map character) of every light, in map order"""
+        positions = []
+        for r, row in enumerate(self.map_lines):
+            for match in LIGHT_CHARS.finditer(row):
+                pos = (match.start(), self.height - r - 1)
+                positions.append((pos, match.group()))
+        return positions
+
+    def cell_index(self):
+        """A CellIndex for one model, sharing this map's static tables"""
+        index = CellIndex(self.width, self.height)
+        index.kinds = self.kinds
+        index.directions = self.directions
+        return index
+
+    def path_finder(self, cell_index):
+        return PathFinder(cell_index, self.topology)
+
+
+def load_static_map(map_file, dictionary_file=MAP_DICTIONARY):
+    """The StaticMap of a file, parsed at most once per process.
+
+    Entries are keyed by path and modification time of both files, so an
+    edited map is parsed again on its next use.
+    """
+    key = (os.path.abspath(map_file), os.path.abspath(dictionary_file))
+    version = (os.stat(map_file).st_mtime_ns, os.stat(dictionary_file).st_mtime_ns)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    static_map = StaticMap(map_file, dictionary_file)
+    with _cache_lock:
+        cached = _cache.get(key)
+        # Another thread may have parsed the same version meanwhile
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        _cache[key] = (version, static_map)
+    return static_map
+
+
+def pair_traffic_lights(positions):
+    """Pair each light with an adjacent one, in map order.
+
+    Returns ({(pos, char): pair_id}, {pair_id: "horizontal" | "vertical"}).
+    Each unpaired light takes the first unpaired light after it in map
+    order among its four orthogonal neighbors, found through a position
+    lookup. Lights left without a neighbor get a pair id of their own and
+    no orientation.
+    """
+    order = {pos: i for i, (pos, _) in enumerate(positions)}
+    partner = [None] * len(positions)
+    paired_lights = {}
+    pair_orientations = {}
+    pair_id = 1
+
+    for i, (pos1, col1) in enumerate(positions):
+        if partner[i] is not None:
+            continue
+        x, y = pos1
+        candidates = [
+            j
+            for j in (
+                order.get((x + 1, y)),
+                order.get((x - 1, y)),
+                order.get((x, y + 1)),
+                order.get((x, y - 1)),
+            )
+            if j is not None and j > i and partner[j] is None
+        ]
+        paired_lights[pos1, col1] = pair_id
+        if candidates:
+            j = min(candidates)
+            partner[i], partner[j] = j, i
+            pos2, col2 = positions[j]
+            paired_lights[pos2, col2] = pair_id
+            is_horizontal = pos1[1] == pos2[1]
+            pair_orientations[pair_id] = "horizontal" if is_horizontal else "vertical"
+        else:
+            partner[i] = i
+        pair_id += 1
+
+    return paired_lights, pair_orientations
+
+
+# Lights up to this many cells apart on both axes belong to one crossing
+NEIGHBOR_RADIUS = 2
+
+
+def find_neighbor_pairs(positions, paired_lights, pair_orientations):
+    """{pair_id: sorted ids of the pairs that cross it}.
+
+    A pair crosses another when one of its lights is within NEIGHBOR_RADIUS
+    cells of one of the other's lights on both axes and their orientations
+    differ. Each light looks only at the window around it.
+    """
+    pair_at = {pos: paired_lights[pos, col] for pos, col in positions}
+    neighbors = {pair_id: set() for pair_id in pair_at.values()}
+    window = range(-NEIGHBOR_RADIUS, NEIGHBOR_RADIUS + 1)
+    for (x, y), pair_id in pair_at.items():
+        orientation = pair_orientations.get(pair_id)
+        for dx in window:
+            for dy in window:
+                other = pair_at.get((x + dx, y + dy))
+                if (
+                    other is not None
+                    and other != pair_id
+                    and pair_orientations.get(other) != orientation
+                ):
+                    neighbors[pair_id].add(other)
+    return {pair_id: tuple(sorted(found)) for pair_id, found in neighbors.items()}
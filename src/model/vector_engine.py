@@ -0,0 +1,247 @@
+# src/model/vector_engine.py
+import numpy as np
+
+from .pathfinding import UNREACHABLE
+
+MOVING, STOPPED = 0, 1
+# Distance used for missing successors and cells that cannot reach the goal
+FAR = np.iinfo(np.int64).max
+# Cars the arrays hold before the first reallocation
+MIN_CAPACITY = 64
+
+
+class VectorCarEngine:
+    """Struct-of-arrays car backend for CityModel(engine="vectorized").
+
+    Car ids, cells, destinations and states live in NumPy arrays, and each
+    step resolves every move with batched array operations. Cars follow the
+    same distance fields as routing="field" agents, including the detour to
+    a free neighbor that is not farther from the destination.
+
+    Moves are settled in rounds. In each round, every car still waiting
+    picks a target, and when several cars pick the same free cell the one
+    with the lowest id wins. Cells vacated in one round can be taken in the
+    next, so a queue can advance in a single step as it does with agents.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        index = model.cell_index
+        size = model.width * model.height
+
+        # Successors padded with the cell itself; `valid` masks the padding
+        self.successors = np.repeat(np.arange(size, dtype=np.int64)[:, None], 4, 1)
+        self.valid = np.zeros((size, 4), dtype=bool)
+        for cell, moves in enumerate(model.path_finder.successors):
+            self.successors[cell, : len(moves)] = moves
+            self.valid[cell, : len(moves)] = True
+
+        self.destination_cells = np.array(
+            [index.cell_id(d.pos) for d in model.destinations], dtype=np.int64
+        )
+        self.light_cells = np.array(
+            [index.cell_id(light.pos) for light in model.traffic_lights],
+            dtype=np.int64,
+        )
+        self.green = np.ones(size, dtype=bool)
+
+        self.load(
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int8),
+        )
+
+    ###################
+    # CAR ARRAYS
+    ###################
+
+    def load(self, ids, cells, destinations, states):
+        """Replace every car with copies of the given columns"""
+        self.count = len(ids)
+        capacity = max(MIN_CAPACITY, self.count)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._cells = np.empty(capacity, dtype=np.int64)
+        self._destinations = np.empty(capacity, dtype=np.int64)
+        self._states = np.empty(capacity, dtype=np.int8)
+        self._ids[: self.count] = ids
+        self._cells[: self.count] = cells
+        self._destinations[: self.count] = destinations
+        self._states[: self.count] = states
+        self._view()
+
+    def _view(self):
+        """Point ids, cells, destinations and states at the live cars"""
+        count = self.count
+        self.ids = self._ids[:count]
+        self.cells = self._cells[:count]
+        self.destinations = self._destinations[:count]
+        self.states = self._states[:count]
+
+    def _grow(self):
+        """Double the buffers, so appending N cars copies O(N) in total"""
+        capacity = 2 * len(self._ids)
+        for name in ("_ids", "_cells", "_destinations", "_states"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: self.count] = old[: self.count]
+            setattr(self, name, new)
+
+    def add(self, car_id, pos):
+        """Append a car at pos, drawing its destination like Car does"""
+        model = self.model
+        # -1 like a Car without destination: it never moves nor arrives
+        destination = (
+            model.random.randrange(len(model.destinations))
+            if model.destinations
+            else -1
+        )
+        cell = model.cell_index.cell_id(pos)
+        if self.count == len(self._ids):
+            self._grow()
+        i = self.count
+        self._ids[i] = car_id
+        self._cells[i] = cell
+        self._destinations[i] = destination
+        self._states[i] = MOVING
+        self.count += 1
+        self._view()
+        model.occupancy[cell] = car_id
+        model.speed_sum += 1
+        model.change_log.car(f"car_{car_id}", pos)
+
+    def positions(self, mask=None):
+        """(unique_id, (x, y)) for every car, or the cars in mask, in id order"""
+        height = self.model.height
+        ids, cells = self.ids, self.cells
+        if mask is not None:
+            ids, cells = ids[mask], cells[mask]
+        for car_id, cell in zip(ids.tolist(), cells.tolist()):
+            yield f"car_{car_id}", (cell // height, cell % height)
+
+    def _remove_arrivals(self):
+        if not len(self.destination_cells):
+            return 0
+        arrived = (self.destinations >= 0) & (
+            self.cells == self.destination_cells[self.destinations]
+        )
+        count = int(arrived.sum())
+        if count:
+            model = self.model
+            model.occupancy[self.cells[arrived]] = -1
+            model.stopped_cars -= int((self.states[arrived] == STOPPED).sum())
+            model.speed_sum -= count
+            model.reached_destination += count
+            for car_id in self.ids[arrived].tolist():
+                model.change_log.car(f"car_{car_id}", None)
+            # Compact in place; the fancy indexing copies before writing
+            keep = ~arrived
+            remaining = self.count - count
+            self._ids[:remaining] = self.ids[keep]
+            self._cells[:remaining] = self.cells[keep]
+            self._destinations[:remaining] = self.destinations[keep]
+            self._states[:remaining] = self.states[keep]
+            self.count = remaining
+            self._view()
+        return count
+
+    # END CAR ARRAYS
+
+    ###################
+    # STEPPING
+    ###################
+
+    def _field(self, destination):
+        """NumPy view of the model's cached field for a destination index"""
+        goal = self.model.destinations[destination].pos
+        return np.frombuffer(self.model.distance_field(goal), dtype=np.int32)
+
+    def _distances(self, successors):
+        """Field values of each car's successors and of its own cell"""
+        distances = np.empty(successors.shape, dtype=np.int64)
+        current = np.empty(len(self.ids), dtype=np.int64)
+        order = np.argsort(self.destinations, kind="stable")
+        bounds = np.flatnonzero(np.diff(self.destinations[order])) + 1
+        for group in np.split(order, bounds):
+            destination = int(self.destinations[group[0]])
+            if destination < 0:
+                distances[group] = FAR
+                current[group] = FAR
+                continue
+            field = self._field(destination)
+            distances[group] = field[successors[group]]
+            current[group] = field[self.cells[group]]
+        distances[(distances == UNREACHABLE) | ~self.valid[self.cells]] = FAR
+        current[current == UNREACHABLE] = FAR
+        return distances, current
+
+    def step(self):
+        """Move every car once; cars that arrived are replaced when spawning"""
+        model = self.model
+        model.pending_spawns += self._remove_arrivals()
+        self.green[self.light_cells] = np.fromiter(
+            (light.state for light in model.traffic_lights),
+            dtype=bool,
+            count=len(self.light_cells),
+        )
+
+        if self.count:
+            self._move_cars()
+
+    def _move_cars(self):
+        occupancy = self.model.occupancy
+        rows = np.arange(self.count)
+        successors = self.successors[self.cells]
+        distances, current = self._distances(successors)
+        best = distances.argmin(axis=1)
+        moved = np.zeros(self.count, dtype=bool)
+        pending = rows[distances[rows, best] < FAR]
+
+        while pending.size:
+            targets = successors[pending, best[pending]]
+            blocked = occupancy[targets] >= 0
+            if blocked.any():
+                detouring = pending[blocked]
+                options = distances[detouring].copy()
+                options[
+                    (occupancy[successors[detouring]] >= 0)
+                    | (options > current[detouring, None])
+                ] = FAR
+                choice = options.argmin(axis=1)
+                free = options[np.arange(len(detouring)), choice] < FAR
+                targets[blocked] = np.where(
+                    free, successors[detouring, choice], -1
+                )
+
+            waiting = targets < 0
+            # A red light will not turn green within this step
+            red = ~waiting & ~self.green[np.maximum(targets, 0)]
+            movers = pending[~waiting & ~red]
+            mover_targets = targets[~waiting & ~red]
+            if movers.size == 0:
+                break
+
+            # Lowest car id wins each contested cell
+            order = np.lexsort((self.ids[movers], mover_targets))
+            sorted_targets = mover_targets[order]
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = sorted_targets[1:] != sorted_targets[:-1]
+            winners = movers[order][first]
+            winner_targets = sorted_targets[first]
+
+            occupancy[self.cells[winners]] = -1
+            occupancy[winner_targets] = self.ids[winners]
+            self.cells[winners] = winner_targets
+            moved[winners] = True
+
+            still_waiting = np.ones(self.count, dtype=bool)
+            still_waiting[winners] = False
+            still_waiting[pending[red]] = False
+            pending = pending[still_waiting[pending]]
+
+        for unique_id, pos in self.positions(moved):
+            self.model.change_log.car(unique_id, pos)
+        self.states[:] = np.where(moved, MOVING, STOPPED)
+        self.model.stopped_cars = int((~moved).sum())
+
+    # END STEPPING
@@ -0,0 +1,30 @@
+# src/visualization/city_canvas.py
+from collections import defaultdict
+
+from mesa.visualization.modules import CanvasGrid
+
+
+class CityCanvasGrid(CanvasGrid):
+    """CanvasGrid that also draws the static map layer.
+
+    Roads and obstacles are not grid agents, so each cell's Road or Obstacle
+    is taken from CityModel.static_agent_at and portrayed under whatever the
+    grid holds there.
+    """
+
+    def render(self, model):
+        grid_state = defaultdict(list)
+        for x in range(model.grid.width):
+            for y in range(model.grid.height):
+                cell_objects = model.grid.get_cell_list_contents([(x, y)])
+                static_agent = model.static_agent_at((x, y))
+                if static_agent is not None:
+                    cell_objects = [static_agent] + cell_objects
+                for obj in cell_objects:
+                    portrayal = self.portrayal_method(obj)
+                    if portrayal:
+                        portrayal["x"] = x
+                        portrayal["y"] = y
+                        grid_state[portrayal["Layer"]].append(portrayal)
+
+        return grid_state
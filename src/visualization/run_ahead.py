@@ -0,0 +1,165 @@
+# src/visualization/run_ahead.py
+from collections import deque
+import threading
+import time
+
+# Steps the worker may run past the slowest reader
+DEFAULT_LEAD = 32
+# Readers that stop asking for frames stop holding the worker back
+READER_TIMEOUT_SECONDS = 30.0
+
+
+class RunAhead:
+    """Background worker that keeps a model ahead of its readers.
+
+    After every step it stores the pre-serialized frames of that step in
+    a ring buffer, so serving a known step is a buffer read. Backpressure
+    comes from the readers: the worker pauses once it is `lead` steps
+    past the slowest reader that asked for a frame in the last
+    READER_TIMEOUT_SECONDS, and the buffer holds exactly the frames those
+    readers can still ask for.
+
+    `step` runs while holding `lock`, the session lock, and
+    `render(model)` returns the frames of the current step.
+    """
+
+    def __init__(self, model, step, lock, render, lead=DEFAULT_LEAD):
+        if lead < 1:
+            raise ValueError("lead must be at least 1")
+        self.model = model
+        self._step = step
+        self._lock = lock
+        self._render = render
+        self.lead = lead
+        self.frames = deque(maxlen=lead + 1)
+        self.stopped = False
+        # reader -> (next step it wants, last time it asked)
+        self.readers = {}
+        self.condition = threading.Condition()
+        with lock:
+            self.frames.append((model.change_log.step, render(model)))
+        # Where readers without a position start
+        self.floor = self.head
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def join(self, timeout=None):
+        """Wait for a stopped worker to end. Never call it holding the lock."""
+        if self._thread.ident is not None:
+            self._thread.join(timeout)
+
+    ###################
+    # WORKER
+    ###################
+
+    @property
+    def head(self):
+        """Newest buffered step"""
+        return self.frames[-1][0]
+
+    @property
+    def oldest(self):
+        return self.frames[0][0]
+
+    def slowest(self):
+        """Step of the slowest active reader, or `floor` when there is none.
+
+        Readers that timed out are forgotten here; once the last one goes,
+        the floor moves to the head so new readers start from live frames.
+        """
+        now = time.monotonic()
+        for reader, (_, seen) in list(self.readers.items()):
+            if now - seen > READER_TIMEOUT_SECONDS:
+                del self.readers[reader]
+                if not self.readers:
+                    self.floor = self.head
+        return min((step for step, _ in self.readers.values()), default=self.floor)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                # Re-checked periodically so expired readers release the worker
+                while not self.stopped and self.head - self.slowest() >= self.lead:
+                    self.condition.wait(1.0)
+                if self.stopped:
+                    return
+            with self._lock:
+                # A reset may have stopped the worker while it waited here
+                if self.stopped:
+                    return
+                self._step()
+                frame = (self.model.change_log.step, self._render(self.model))
+            with self.condition:
+                self.frames.append(frame)
+                self.condition.notify_all()
+
+    # END WORKER
+
+    ###################
+    # READERS
+    ###################
+
+    def position(self, reader):
+        """Next step a reader will be served"""
+        with self.condition:
+            step, _ = self.readers.get(reader, (self.floor, None))
+            return step
+
+    def advance(self, reader, n=1):
+        """Move a reader's position forward, the /step of run-ahead mode.
+
+        A reader moves at most `lead` steps per call, the most the worker
+        can have buffered past it.
+        """
+        with self.condition:
+            step = self.position(reader) + min(n, self.lead)
+            self.readers[reader] = (step, time.monotonic())
+            self.condition.notify_all()
+            return step
+
+    def read(self, reader, step=None, timeout=10.0):
+        """Frames of `step` (default: the reader's position).
+
+        Waits up to `timeout` for the worker to get there and returns None
+        when the step is no longer buffered or was not reached in time.
+        """
+        with self.condition:
+            if step is None:
+                step = self.position(reader)
+            if step < self.oldest:
+                return None
+            self.readers[reader] = (step, time.monotonic())
+            self.condition.notify_all()
+            self.condition.wait_for(
+                lambda: self.stopped or self.head >= step, timeout
+            )
+            if step < self.oldest or step > self.head:
+                return None
+            buffered_step, frames = self.frames[step - self.oldest]
+            if buffered_step != step:
+                return None
+            return frames
+
+    # END READERS
+
+    def status(self):
+        with self.condition:
+            slowest = self.slowest()
+            return {
+                "head": self.head,
+                "oldest": self.oldest,
+                "slowest_reader": slowest,
+                "ahead": self.head - slowest,
+                "lead": self.lead,
+                "buffered": len(self.frames),
+                "readers": len(self.readers),
+                "stopped": self.stopped,
+            }
@@ -1,13 +1,15 @@
 # src/visualization/server.py
-from mesa.visualization.modules import CanvasGrid, ChartModule, TextElement
+from mesa.visualization.modules import ChartModule, TextElement
 from mesa.visualization.ModularVisualization import ModularServer
-from mesa.visualization.UserParam import Slider
+from mesa.visualization.UserParam import Slider, Choice
 from ..model.city_model import CityModel
+from ..model.static_map import load_static_map
 from ..agents.car import Car
 from ..agents.road import Road
 from ..agents.traffic_light import Traffic_Light
 from ..agents.destination import Destination
 from ..agents.obstacle import Obstacle
+from .city_canvas import CityCanvasGrid
 
 class NumAgentsText(TextElement):
     def __init__(self):
@@ -30,6 +32,17 @@ class ReachedDestinationText(TextElement):
     def render(self, model):
         return f"Reached Destination: {model.reached_destination}"
 
+class TrafficCountersText(TextElement):
+    def __init__(self):
+        pass
+
+    def render(self, model):
+        return (
+            f"Cars on Map: {model.car_count} / "
+            f"Stopped Cars: {model.count_stopped_cars()} / "
+            f"Average Speed: {model.calculate_average_speed():.2f}"
+        )
+
 def agent_portrayal(agent):
     if agent is None:
         return
@@ -72,12 +85,10 @@ def agent_portrayal(agent):
     return portrayal
 
 def create_server():
-    # Get grid dimensions from the map file
-    with open("city_files/2022_base.txt") as baseFile:
-        lines = baseFile.readlines()
-        width = len(lines[0]) - 1
-        height = len(lines)
-    grid = CanvasGrid(agent_portrayal, width, height, 500, 500)
+    # Grid dimensions from the cached map the models will also use
+    static_map = load_static_map("city_files/2022_base.txt")
+    width, height = static_map.width, static_map.height
+    grid = CityCanvasGrid(agent_portrayal, width, height, 500, 500)
     traffic_chart = ChartModule(
         [
             {"Label": "Car_Count", "Color": "#FF0000"},
@@ -93,12 +104,14 @@ def create_server():
     num_agents_text = NumAgentsText()
     current_agents_text = CurrentAgentsText()
     reached_destination_text = ReachedDestinationText()
+    traffic_counters_text = TrafficCountersText()
     model_params = {
         "N": Slider("Number of Cars", 100, 1, 150, 1),
+        "routing": Choice("Routing", value="astar", choices=["astar", "field"]),
     }
     server = ModularServer(
         CityModel,
-        [grid, traffic_chart, density_chart, num_agents_text, current_agents_text, reached_destination_text],
+        [grid, traffic_chart, density_chart, num_agents_text, current_agents_text, reached_destination_text, traffic_counters_text],
         "Traffic Simulation",
         model_params,
     )
@@ -0,0 +1,196 @@
+# src/visualization/sessions.py
+from collections import OrderedDict
+import threading
+import time
+import uuid
+
+from src.model.city_model import CityModel
+from src.model.static_map import load_static_map
+
+DEFAULT_MAP = "city_files/2022_base.txt"
+# Requests that name no session share this one
+DEFAULT_SESSION = "default"
+
+
+class Session:
+    """One viewer's simulation: its model, lock, step count and stream"""
+
+    def __init__(self, session_id, model, number_agents, routing):
+        self.id = session_id
+        self.model = model
+        self.number_agents = number_agents
+        self.routing = routing
+        self.current_step = 0
+        # State right after construction, which reset() goes back to
+        self.initial_snapshot = model.snapshot()
+        # Held by every handler that touches the model and by its stream
+        self.lock = threading.RLock()
+        self.stream = None
+        self.run_ahead = None
+        self.last_used = time.monotonic()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def stop_stream(self):
+        """Stop the stream and return it, or None when there was none"""
+        stream, self.stream = self.stream, None
+        if stream is not None:
+            stream.stop()
+        return stream
+
+    def stop_run_ahead(self):
+        """Stop the run-ahead worker and return it, or None when there was none"""
+        run_ahead, self.run_ahead = self.run_ahead, None
+        if run_ahead is not None:
+            run_ahead.stop()
+        return run_ahead
+
+    def stop_workers(self):
+        """Stop every background thread stepping this session's model.
+
+        Called with the lock held. Returns the stopped workers, which
+        join_workers waits for once the lock is released: until then a
+        worker may be blocked on the lock itself.
+        """
+        return [
+            worker
+            for worker in (self.stop_stream(), self.stop_run_ahead())
+            if worker is not None
+        ]
+
+    @staticmethod
+    def join_workers(workers):
+        for worker in workers:
+            worker.join()
+
+    def close(self):
+        """Stop and join the workers of a session that is being dropped"""
+        with self.lock:
+            stopped = self.stop_workers()
+        self.join_workers(stopped)
+
+    def reset(self):
+        """Back to step 0 by restoring the initial snapshot, not rebuilding"""
+        with self.lock:
+            stopped = self.stop_workers()
+            self.model.restore(self.initial_snapshot)
+            self.current_step = 0
+        self.join_workers(stopped)
+
+    def footprint(self):
+        """Rough bytes held by this session beyond the shared static map.
+
+        Counts the occupancy layer, the search scratch tables, the cached
+        distance fields, a flat cost per agent and any run-ahead frames.
+        """
+        model = self.model
+        cells = model.width * model.height
+        fields = sum(len(field) for field in model.distance_fields.values())
+        agents = model.car_count + len(model.traffic_lights) + len(model.destinations)
+        frames = 0
+        if self.run_ahead is not None:
+            frames = sum(
+                len(data) for _, buffered in self.run_ahead.frames for data in buffered
+            )
+        return 4 * cells + 4 * 8 * cells + 4 * fields + 1024 * agents + frames
+
+
+class SessionRegistry:
+    """Sessions by id, with idle-time eviction and caps on count and memory.
+
+    Models of the same map file are built from the process-wide StaticMap
+    cache, so a new session skips parsing and road-graph compilation. When the caps
+    are exceeded the least recently used sessions are dropped first.
+    """
+
+    def __init__(
+        self,
+        max_sessions=16,
+        idle_seconds=900,
+        memory_budget=1 << 30,
+        eviction_interval=30,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.memory_budget = memory_budget
+        # Least seconds between evictions triggered by get()
+        self.eviction_interval = eviction_interval
+        self._last_eviction = time.monotonic()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(
+        self, session_id=None, number_agents=1, routing="astar", map_file=DEFAULT_MAP
+    ):
+        """Build a session, replacing any session with the same id"""
+        session_id = session_id or uuid.uuid4().hex
+        model = CityModel(
+            number_agents, routing=routing, static_map=load_static_map(map_file)
+        )
+        session = Session(session_id, model, number_agents, routing)
+        with self._lock:
+            previous = self._sessions.pop(session_id, None)
+            self._sessions[session_id] = session
+        if previous is not None:
+            previous.close()
+        self.evict(keep=session_id)
+        return session
+
+    def get(self, session_id):
+        """The live session for an id, or None when it never existed or was evicted"""
+        # Sessions of viewers that left are only dropped here; evict() sums
+        # every footprint, so it runs at most once per eviction_interval
+        if time.monotonic() - self._last_eviction >= self.eviction_interval:
+            self.evict(keep=session_id)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.touch()
+        return session
+
+    def remove(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session is not None
+
+    def evict(self, keep=None):
+        """Drop idle sessions, then the least recently used over the caps"""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            self._last_eviction = now
+            for session_id, session in list(self._sessions.items()):
+                if session_id != keep and now - session.last_used > self.idle_seconds:
+                    evicted.append(self._sessions.pop(session_id))
+
+            total = sum(session.footprint() for session in self._sessions.values())
+            for session_id in list(self._sessions):
+                over_count = len(self._sessions) > self.max_sessions
+                if not over_count and total <= self.memory_budget:
+                    break
+                if session_id == keep:
+                    continue
+                session = self._sessions.pop(session_id)
+                total -= session.footprint()
+                evicted.append(session)
+
+        for session in evicted:
+            session.close()
+        return [session.id for session in evicted]
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "memory_bytes": sum(session.footprint() for session in sessions),
+            "memory_budget": self.memory_budget,
+        }
@@ -0,0 +1,139 @@
+# src/visualization/streaming.py
+import json
+import threading
+import time
+
+# Steps per second when a client does not ask for a rate
+DEFAULT_RATE = 10.0
+# Seconds between SSE comments that keep idle connections open
+KEEPALIVE_SECONDS = 15.0
+
+
+class StepStream:
+    """Advances a model in a background thread and wakes streaming clients.
+
+    `step` is called once per tick while holding `lock`, the same lock the
+    HTTP handlers take, so stepping never overlaps a request. Clients do not
+    get a queue of frames: each one waits for the model to move past its own
+    cursor and then renders a single frame from the change log, so a slow
+    client receives one larger delta instead of a backlog.
+
+    A rate of 0 steps as fast as the simulation allows.
+    """
+
+    def __init__(self, model, step, lock, rate=DEFAULT_RATE):
+        self.model = model
+        self._step = step
+        self.condition = threading.Condition(lock)
+        self.rate = rate
+        self.stopped = False
+        self._running = threading.Event()
+        # Set to cut a throttling sleep short after pause, rate or stop
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    ###################
+    # CONTROL
+    ###################
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def start(self):
+        self._running.set()
+        self._thread.start()
+        return self
+
+    def pause(self):
+        self._running.clear()
+        self._wake.set()
+
+    def resume(self):
+        self._running.set()
+
+    def set_rate(self, rate):
+        if rate < 0:
+            raise ValueError("rate must be 0 (unthrottled) or positive")
+        self.rate = rate
+        self._wake.set()
+
+    def stop(self):
+        """End the thread and every open client stream"""
+        self.stopped = True
+        self._running.set()
+        self._wake.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def join(self, timeout=None):
+        """Wait for a stopped thread to end. Never call it holding the lock."""
+        if self._thread.ident is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        return {
+            "paused": self.paused,
+            "rate": self.rate,
+            "step": self.model.change_log.step,
+        }
+
+    # END CONTROL
+
+    ###################
+    # STEPPING
+    ###################
+
+    def _run(self):
+        while True:
+            self._running.wait()
+            if self.stopped:
+                return
+            started = time.perf_counter()
+            with self.condition:
+                # stop() may have run while this thread waited for the lock,
+                # for instance by a reset that restored the model meanwhile
+                if self.stopped:
+                    return
+                self._step()
+                self.condition.notify_all()
+            if self.rate:
+                self._wake.clear()
+                self._wake.wait(1 / self.rate - (time.perf_counter() - started))
+
+    # END STEPPING
+
+    ###################
+    # CLIENTS
+    ###################
+
+    def events(self, render, since=None):
+        """Server-Sent Events: one frame each time the model moved on.
+
+        render(model, since) builds a payload with a "step" key; the first
+        frame is rendered from `since`, every later one from the previous
+        frame's step.
+        """
+        cursor = since
+        fresh = True
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.stopped
+                    or fresh
+                    or self.model.change_log.step != cursor,
+                    KEEPALIVE_SECONDS,
+                )
+                if self.stopped:
+                    return
+                payload = None
+                if fresh or self.model.change_log.step != cursor:
+                    payload = render(self.model, cursor)
+                    cursor = payload["step"]
+                    fresh = False
+            if payload is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {json.dumps(payload)}\n\n"
+
+    # END CLIENTS
@@ -1,119 +1,475 @@
-from mesa.visualization.modules import CanvasGrid, ChartModule, TextElement
+from mesa.visualization.modules import ChartModule, TextElement
 from mesa.visualization.ModularVisualization import ModularServer
-from mesa.visualization.UserParam import Slider
-from flask import Flask, request, jsonify
+from mesa.visualization.UserParam import Slider, Choice
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from src.model.city_model import CityModel
+from src.model.city_model import ROUTING_MODES, CityModel
+from src.model.static_map import load_static_map
 from src.agents.car import Car
 from src.agents.road import Road
 from src.agents.traffic_light import Traffic_Light
 from src.agents.destination import Destination
 from src.agents.obstacle import Obstacle
+from src.visualization.city_canvas import CityCanvasGrid
+from src.visualization.run_ahead import DEFAULT_LEAD, RunAhead
+from src.visualization.sessions import DEFAULT_SESSION, SessionRegistry
+from src.visualization.streaming import StepStream
+import json
+import numpy as np
 
 # Global variables for Flask server
-number_agents = 100
 width = 28
 height = 28
-cityModel = None
-currentStep = 0
+# One CityModel per viewer, see SessionRegistry
+sessions = SessionRegistry()
 
 # Flask application
 app = Flask("Traffic Simulation")
 CORS(app)
 
 
+def session_id():
+    """Session named by the X-Session-Id header, ?session= or the JSON body"""
+    body = request.get_json(silent=True)
+    return (
+        request.headers.get("X-Session-Id")
+        or request.args.get("session")
+        or (body.get("session") if isinstance(body, dict) else None)
+        or DEFAULT_SESSION
+    )
+
+
+def not_initialized():
+    return jsonify({"error": "Model not initialized"}), 400
+
+
 @app.route("/init", methods=["POST"])
 def init_model():
-    global cityModel, currentStep, number_agents
-
+    """Create (or replace) the requesting session's model"""
     if request.method == "POST":
         try:
             number_agents = int(request.json.get("NAgents", 1))
-            currentStep = 0
-            cityModel = CityModel(number_agents)
-            return jsonify({"message": "Model initialized"})
+            routing = request.json.get("routing", "astar")
+            if routing not in ROUTING_MODES:
+                raise ValueError(
+                    f"routing must be one of {', '.join(ROUTING_MODES)}, "
+                    f"not {routing!r}"
+                )
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            session = sessions.create(session_id(), number_agents, routing)
+            return jsonify({"message": "Model initialized", "session": session.id})
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
 
-@app.route("/state", methods=["GET"])
-def get_state():
-    if cityModel is None:
-        return jsonify({"error": "Model not initialized"}), 400
+def car_payload(unique_id, pos):
+    return {"id": str(unique_id), "x": pos[0], "y": 0, "z": pos[1]}
+
 
-    # Only get cars and traffic lights
+def serialize_state(model):
+    """Cars and traffic lights of a model as the /state payload"""
     cars = []
     traffic_lights = []
 
-    for agent in cityModel.schedule.agents:
-        if isinstance(agent, Car):
-            pos = agent.pos
-            cars.append({"id": str(agent.unique_id), "x": pos[0], "y": 0, "z": pos[1]})
-        elif isinstance(agent, Traffic_Light):
-            pos = agent.pos
-            traffic_lights.append(
-                {
-                    "id": str(agent.unique_id),
-                    "x": pos[0],
-                    "y": 0,
-                    "z": pos[1],
-                    "state": agent.state,
-                }
-            )
+    for unique_id, pos in model.iter_car_positions():
+        cars.append(car_payload(unique_id, pos))
+
+    for agent in model.traffic_lights:
+        pos = agent.pos
+        traffic_lights.append(
+            {
+                "id": str(agent.unique_id),
+                "x": pos[0],
+                "y": 0,
+                "z": pos[1],
+                "state": agent.state,
+            }
+        )
+
+    return {
+        "step": model.change_log.step,
+        "full": True,
+        "cars": cars,
+        "traffic_lights": traffic_lights,
+    }
+
+
+def serialize_changes(model, since):
+    """What changed after step `since`, or None when the log is too short.
+
+    Cars that moved or appeared are sent like in the full state, cars that
+    left the map are listed in removed_cars, and lights only carry their id
+    and new state.
+    """
+    changes = model.change_log.since(since)
+    if changes is None:
+        return None
+    car_changes, light_changes = changes
+
+    cars = []
+    removed_cars = []
+    for unique_id, pos in car_changes.items():
+        if pos is None:
+            removed_cars.append(str(unique_id))
+        else:
+            cars.append(car_payload(unique_id, pos))
+
+    return {
+        "step": model.change_log.step,
+        "since": since,
+        "full": False,
+        "cars": cars,
+        "removed_cars": removed_cars,
+        "traffic_lights": [
+            {"id": str(unique_id), "state": state}
+            for unique_id, state in light_changes.items()
+        ],
+    }
+
+
+def pack_frame(model):
+    """Cars and light states as one little-endian binary frame.
+
+    Layout, every field 4-byte aligned up to the bitset:
+        uint32 step, uint32 car_count, uint32 light_count
+        int32 car index[car_count]   (the n of "car_n")
+        int32 x[car_count]
+        int32 z[car_count]
+        light bitset, ceil(light_count / 8) bytes, bit i = light i is green
+
+    Lights follow the order of the full /state payload. Cars are read
+    straight from the occupancy layer, in cell order.
+    """
+    cells = np.flatnonzero(model.occupancy >= 0)
+    header = np.array(
+        [model.change_log.step, len(cells), len(model.traffic_lights)], dtype="<u4"
+    )
+    cars = np.empty((3, len(cells)), dtype="<i4")
+    cars[0] = model.occupancy[cells]
+    cars[1] = cells // model.height
+    cars[2] = cells % model.height
+    lights = np.fromiter(
+        (light.state for light in model.traffic_lights),
+        dtype=bool,
+        count=len(model.traffic_lights),
+    )
+    bitset = np.packbits(lights, bitorder="little")
+    return header.tobytes() + cars.tobytes() + bitset.tobytes()
+
+
+def render_frames(model):
+    """Pre-serialized JSON state and binary frame, for the run-ahead buffer"""
+    return json.dumps(serialize_state(model)).encode(), pack_frame(model)
+
+
+def buffered_response(session, step=None, binary=False):
+    """A frame from the session's run-ahead buffer for ?reader= (or default).
 
-    return jsonify({"cars": cars, "traffic_lights": traffic_lights})
+    Answers 410 with the buffer status when the step is gone or was not
+    reached in time.
+    """
+    reader = request.args.get("reader", DEFAULT_SESSION)
+    frames = session.run_ahead.read(reader, step)
+    if frames is None:
+        status = session.run_ahead.status()
+        return jsonify({"error": "Step not buffered", **status}), 410
+    if binary:
+        return Response(frames[1], mimetype="application/octet-stream")
+    return Response(frames[0], mimetype="application/json")
+
+
+def state_payload(model, since=None):
+    """Changes after `since` when the change log covers them, else everything"""
+    if since is not None:
+        changes = serialize_changes(model, since)
+        if changes is not None:
+            return changes
+    return serialize_state(model)
+
+
+@app.route("/state", methods=["GET"])
+def get_state():
+    """Full state, or only the changes after ?since=<step>.
+
+    A delta that cannot be built (cursor older than the change log, or
+    ahead of the model) falls back to the full state.
+    """
+    session = sessions.get(session_id())
+    if session is None:
+        return not_initialized()
+    if session.run_ahead is not None:
+        return buffered_response(session, request.args.get("step", type=int))
+
+    since = request.args.get("since", type=int)
+    with session.lock:
+        return jsonify(state_payload(session.model, since))
+
+
+@app.route("/frame", methods=["GET"])
+def get_frame():
+    """The full state as a binary frame, see pack_frame"""
+    session = sessions.get(session_id())
+    if session is None:
+        return not_initialized()
+    if session.run_ahead is not None:
+        step = request.args.get("step", type=int)
+        return buffered_response(session, step, binary=True)
+
+    with session.lock:
+        frame = pack_frame(session.model)
+    return Response(frame, mimetype="application/octet-stream")
+
+
+def advance(session, n=1, collect=True):
+    """Run n steps; with collect=False only the last one is collected"""
+    for i in range(n):
+        session.model.step(collect=collect or i == n - 1)
+        session.current_step += 1
+
+
+def ensure_stream(session):
+    with session.lock:
+        if session.stream is None:
+            session.stream = StepStream(
+                session.model, lambda: advance(session), session.lock
+            ).start()
+        return session.stream
+
+
+@app.route("/stream", methods=["GET"])
+def stream_steps():
+    """Server-Sent Events with one frame per step, see StepStream.
+
+    ?rate=<steps per second> sets the speed (0 runs unthrottled) and
+    ?since=<step> makes the first frame a delta. Every later frame is a
+    delta from the previous one. The stream starts the first time a client
+    connects and ends when the model is re-initialized or reset.
+    """
+    session = sessions.get(session_id())
+    if session is None:
+        return not_initialized()
+    if session.run_ahead is not None:
+        return jsonify({"error": "Run-ahead mode is active"}), 409
+
+    stream = ensure_stream(session)
+    rate = request.args.get("rate", type=float)
+    try:
+        if rate is not None:
+            stream.set_rate(rate)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    since = request.args.get("since", type=int)
+    return Response(
+        stream.events(state_payload, since),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/stream/control", methods=["POST"])
+def control_stream():
+    """{"action": "pause" | "resume", "rate": <steps per second>}"""
+    session = sessions.get(session_id())
+    if session is None:
+        return not_initialized()
+    if session.run_ahead is not None:
+        return jsonify({"error": "Run-ahead mode is active"}), 409
+
+    stream = ensure_stream(session)
+    body = request.get_json(silent=True) or {}
+    action = body.get("action")
+    try:
+        if "rate" in body:
+            stream.set_rate(float(body["rate"]))
+        if action == "pause":
+            stream.pause()
+        elif action == "resume":
+            stream.resume()
+        elif action is not None:
+            raise ValueError(f"Unknown action: {action!r}")
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(stream.status())
+
+
+def parse_flag(value):
+    """JSON booleans or query-string flags such as 1/0 and true/false"""
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("1", "true", "yes"):
+        return True
+    if str(value).lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"Not a boolean: {value!r}")
 
 
 @app.route("/step", methods=["POST"])
 def step_model():
-    global currentStep, cityModel
-    if cityModel is None:
-        return jsonify({"error": "Model not initialized"}), 400
+    """Advance n steps (default 1) in one request.
+
+    Parameters come from the JSON body or the query string. collect=false
+    skips the DataCollector on every step but the last, and include_state
+    adds the resulting state, or the delta after `since`, to the response.
+    In run-ahead mode n is capped at the worker's lead, and since and
+    collect are rejected.
+    """
+    session = sessions.get(session_id())
+    if session is None:
+        return not_initialized()
+
+    params = {**request.args, **(request.get_json(silent=True) or {})}
+    try:
+        n = int(params.get("n", 1))
+        collect = parse_flag(params.get("collect", True))
+        include_state = parse_flag(params.get("include_state", False))
+        since = params.get("since")
+        since = None if since is None else int(since)
+        if n < 1:
+            raise ValueError("n must be at least 1")
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    if session.run_ahead is not None:
+        # The worker already stepped and rendered full states, with the
+        # DataCollector running on every step
+        ignored = [name for name in ("since", "collect") if name in params]
+        if ignored:
+            return (
+                jsonify({"error": f"Not supported in run-ahead mode: {ignored}"}),
+                400,
+            )
+        # Only this reader's position moves, at most `lead` steps at a time
+        reader = params.get("reader", DEFAULT_SESSION)
+        step = session.run_ahead.advance(reader, n)
+        response = {"message": f"Model updated to step {step}", "currentStep": step}
+        if not include_state:
+            return jsonify(response)
+        frames = session.run_ahead.read(reader, step)
+        if frames is None:
+            return jsonify({"error": "Step not buffered"}), 410
+        # Splice the buffered JSON in rather than parsing it again
+        body = json.dumps(response)[:-1] + ', "state": ' + frames[0].decode() + "}"
+        return Response(body, mimetype="application/json")
 
     try:
-        cityModel.step()
-        currentStep += 1
-        return jsonify(
-            {
-                "message": f"Model updated to step {currentStep}",
-                "currentStep": currentStep,
+        with session.lock:
+            advance(session, n, collect)
+            response = {
+                "message": f"Model updated to step {session.current_step}",
+                "currentStep": session.current_step,
             }
-        )
+            if include_state:
+                response["state"] = state_payload(session.model, since)
+            return jsonify(response)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/info", methods=["GET"])
 def get_info():
-    if cityModel is None:
-        return jsonify({"error": "Model not initialized"}), 400
-
-    return jsonify(
-        {
-            "number_of_cars": len(
-                [agent for agent in cityModel.schedule.agents if isinstance(agent, Car)]
-            ),
-            "number_of_traffic_lights": len(
-                [
-                    agent
-                    for agent in cityModel.schedule.agents
-                    if isinstance(agent, Traffic_Light)
-                ]
-            ),
-            "grid_size": cityModel.grid.width * cityModel.grid.height,
-            "current_step": currentStep,
-        }
-    )
+    session = sessions.get(session_id())
+    if session is None:
+        return not_initialized()
+
+    with session.lock:
+        model = session.model
+        return jsonify(
+            {
+                "number_of_cars": model.car_count,
+                "stopped_cars": model.count_stopped_cars(),
+                "average_speed": model.calculate_average_speed(),
+                "number_of_traffic_lights": len(model.traffic_lights),
+                "grid_size": model.grid.width * model.grid.height,
+                "current_step": session.current_step,
+                "stage_times_ms": {
+                    stage: seconds * 1e3
+                    for stage, seconds in model.schedule.stage_times.items()
+                },
+                "run_ahead": (
+                    session.run_ahead.status() if session.run_ahead else None
+                ),
+            }
+        )
+
+
+@app.route("/runahead", methods=["POST"])
+def start_run_ahead():
+    """Step the session in the background, up to "lead" steps past its readers.
+
+    While active, /state and /frame serve buffered frames of ?step= or of
+    the reader's position, and /step only moves that position.
+    """
+    session = sessions.get(session_id())
+    if session is None:
+        return not_initialized()
+
+    body = request.get_json(silent=True) or {}
+    stopped = []
+    try:
+        lead = int(body.get("lead", request.args.get("lead", DEFAULT_LEAD)))
+        with session.lock:
+            stopped = session.stop_workers()
+            session.run_ahead = RunAhead(
+                session.model,
+                lambda: advance(session),
+                session.lock,
+                render_frames,
+                lead,
+            ).start()
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        session.join_workers(stopped)
+    return jsonify(session.run_ahead.status())
+
+
+@app.route("/runahead", methods=["GET"])
+def run_ahead_status():
+    """How far the worker is ahead of the slowest reader, and buffer usage"""
+    session = sessions.get(session_id())
+    if session is None or session.run_ahead is None:
+        return jsonify({"error": "Run-ahead mode is not active"}), 400
+    return jsonify(session.run_ahead.status())
+
+
+@app.route("/runahead", methods=["DELETE"])
+def stop_run_ahead():
+    session = sessions.get(session_id())
+    if session is None:
+        return not_initialized()
+    with session.lock:
+        stopped = session.stop_run_ahead()
+    if stopped is not None:
+        stopped.join()
+    return jsonify({"message": "Run-ahead stopped"})
 
 
 @app.route("/reset", methods=["POST"])
 def reset_simulation():
-    global cityModel, currentStep
-    if cityModel is not None:
-        cityModel = CityModel(number_agents)
-        currentStep = 0
+    """Return the session to its state right after /init"""
+    session = sessions.get(session_id())
+    if session is not None:
+        session.reset()
         return jsonify({"message": "Simulation reset"})
-    return jsonify({"error": "Model not initialized"}), 400
+    return not_initialized()
+
+
+@app.route("/session", methods=["DELETE"])
+def close_session():
+    """Drop the requesting session and stop its stream"""
+    if sessions.remove(session_id()):
+        return jsonify({"message": "Session closed"})
+    return not_initialized()
+
+
+@app.route("/sessions", methods=["GET"])
+def get_sessions():
+    """Session count and estimated memory against the registry's caps"""
+    sessions.evict()
+    return jsonify(sessions.stats())
 
 
 def agent_portrayal(agent):
@@ -169,20 +525,18 @@ class CarInfoElement(TextElement):
         pass
 
     def render(self, model):
-        current_cars = len(
-            [agent for agent in model.schedule.agents if isinstance(agent, Car)]
+        return (
+            f"Current Cars: {model.car_count} / Maximum Cars: {model.num_agents}"
+            f" / Stopped Cars: {model.count_stopped_cars()}"
         )
-        return f"Current Cars: {current_cars} / Maximum Cars: {model.num_agents}"
 
 
 def create_server():
-    # Get grid dimensions from the map file
-    with open("city_files/2022_base.txt") as baseFile:
-        lines = baseFile.readlines()
-        width = len(lines[0]) - 1
-        height = len(lines)
+    # Grid dimensions from the cached map the models will also use
+    static_map = load_static_map("city_files/2022_base.txt")
+    width, height = static_map.width, static_map.height
 
-    grid = CanvasGrid(agent_portrayal, width, height, 500, 500)
+    grid = CityCanvasGrid(agent_portrayal, width, height, 500, 500)
     car_info = CarInfoElement()
     traffic_chart = ChartModule(
         [
@@ -198,6 +552,7 @@ def create_server():
 
     model_params = {
         "N": Slider("Number of Cars", 1, 1, 150, 1),
+        "routing": Choice("Routing", value="astar", choices=["astar", "field"]),
     }
 
     mesa_server = ModularServer(
@@ -0,0 +1,244 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from src.agents.car import REPLAN_PATIENCE
+from src.batch_run import run_simulation
+from src.model.change_log import ChangeLog
+from src.model.city_model import CityModel
+from src.model.intersections import PhaseWheel
+from src.model.map_generator import generated_map
+from src.model.snapshot import Snapshot
+from src.model.sparse_grid import SparseMultiGrid
+from src.model.static_map import load_static_map
+
+BASE_MAP = "city_files/2022_base.txt"
+MODES = [("agents", "astar"), ("agents", "field"), ("vectorized", "field")]
+
+
+def fingerprint(model):
+    return (
+        model.schedule.steps,
+        sorted(model.iter_car_positions()),
+        [light.state for light in model.traffic_lights],
+        model.reached_destination,
+        model.random.random(),
+    )
+
+
+###################
+# SNAPSHOTS
+###################
+
+
+@pytest.mark.parametrize("engine, routing", MODES)
+def test_restore_continues_the_run(engine, routing):
+    model = CityModel(20, seed=4, engine=engine, routing=routing)
+    for _ in range(15):
+        model.step()
+    snapshot = model.snapshot()
+    for _ in range(25):
+        model.step()
+    expected = fingerprint(model)
+
+    model.restore(snapshot)
+    assert model.change_log.step == 15
+    for _ in range(25):
+        model.step()
+    assert fingerprint(model) == expected
+
+
+def test_snapshot_files(tmp_path):
+    model = CityModel(20, seed=4)
+    for _ in range(10):
+        model.step()
+    path = tmp_path / "run.snapshot"
+    model.snapshot().save(path)
+    restored = CityModel.from_snapshot(Snapshot.load(path))
+    for _ in range(10):
+        model.step()
+        restored.step()
+    assert fingerprint(restored) == fingerprint(model)
+
+
+def test_restore_rejects_other_modes():
+    snapshot = CityModel(5, seed=1).snapshot()
+    with pytest.raises(ValueError):
+        CityModel(5, seed=1, routing="field").restore(snapshot)
+
+
+def test_batch_checkpoints(tmp_path):
+    arguments = dict(agents=10, map_file=BASE_MAP, routing=None)
+    expected, _ = run_simulation(0, 3, steps=20, **arguments)
+    run_simulation(
+        0, 3, steps=10, checkpoint_every=5, checkpoint_dir=str(tmp_path), **arguments
+    )
+    assert os.listdir(tmp_path) == ["run_0.snapshot"]
+
+    resumed, _ = run_simulation(
+        0, 3, steps=20, checkpoint_dir=str(tmp_path), **arguments
+    )
+    assert resumed == expected
+    with pytest.raises(ValueError, match="seed"):
+        run_simulation(0, 4, steps=20, checkpoint_dir=str(tmp_path), **arguments)
+
+
+# END SNAPSHOTS
+
+###################
+# LIGHTS AND SCHEDULING
+###################
+
+
+def test_phase_wheel_matches_stepping_each_light():
+    wheel_model = CityModel(0, seed=1)
+    light_model = CityModel(0, seed=1)
+    for step in range(60):
+        wheel_model.phase_wheel.advance(step)
+        light_model.schedule.steps = step
+        for light in light_model.traffic_lights:
+            light.step()
+        assert [light.state for light in wheel_model.traffic_lights] == [
+            light.state for light in light_model.traffic_lights
+        ]
+
+
+def test_phase_wheel_reset():
+    model = CityModel(0, seed=1)
+    controllers = model.intersection_controllers
+    wheel = PhaseWheel(controllers, 7)
+    due = {i for i, slot in enumerate(wheel.slots) for i in slot}
+    assert due == set(range(len(controllers)))
+    for i, controller in enumerate(controllers):
+        assert i in wheel.slots[controller.next_change(7) % wheel.size]
+
+
+def test_scheduler_only_holds_cars():
+    model = CityModel(10, seed=2)
+    for _ in range(30):
+        model.step()
+    schedule = model.schedule
+    assert {car.unique_id for car in schedule.agents} == set(model.cars)
+    assert schedule.get_agent_count() == model.car_count
+    for index, car in enumerate(schedule.cars):
+        assert schedule._slots[car.unique_id] == index
+    assert set(schedule.stage_times) == {"collect", "signals", "cars", "spawning"}
+    with pytest.raises(ValueError):
+        schedule.add(schedule.cars[0])
+
+
+# END LIGHTS AND SCHEDULING
+
+###################
+# CARS
+###################
+
+
+def test_blocked_car_backs_off_without_building_fields():
+    model = CityModel(0, seed=1)
+    car = model.spawn_car((0, 0))
+    car.path = [(0, 1)]
+    car._check_collision = lambda position: True
+    replans = []
+    car.replan = lambda: replans.append(model.schedule.steps)
+    for _ in range(3 * REPLAN_PATIENCE):
+        car._handle_blocked_movement()
+    assert len(replans) == 3
+    assert car.stuck_counter == 0
+    assert not model.distance_fields
+
+
+def test_replan_routes_around_cars():
+    model = CityModel(0, seed=1)
+    height = model.height
+    field = model.distance_field(model.destinations[0].pos)
+    start = next(
+        cell
+        for cell, distance in enumerate(field)
+        if distance > 10 and len(model.path_finder.successors[cell]) > 1
+    )
+    car = model.spawn_car((start // height, start % height))
+    car.destination = model.destinations[0]
+    blocker = model.path_finder.route(start, field)[0]
+    model.spawn_car((blocker // height, blocker % height))
+    assert car.replan()
+    assert (blocker // height, blocker % height) not in car.path
+    assert car.path[-1] == car.destination.pos
+
+
+# END CARS
+
+###################
+# STORAGE
+###################
+
+
+def test_sparse_grid_stays_sparse():
+    grid = SparseMultiGrid(10, 10, torus=False)
+    agent = SimpleNamespace(pos=None)
+    assert grid.is_cell_empty((3, 3))
+    assert grid.get_cell_list_contents([(3, 3), (4, 4)]) == []
+    assert grid.get_neighbors((3, 3), moore=True) == []
+    assert len(list(grid)) == 100
+    assert not any(grid._grid)
+
+    grid.place_agent(agent, (3, 3))
+    assert grid.get_cell_list_contents([(3, 3)]) == [agent]
+    grid.move_agent(agent, (4, 4))
+    assert grid.is_cell_empty((3, 3)) and not grid.is_cell_empty((4, 4))
+    grid.remove_agent(agent)
+    assert agent.pos is None
+    assert not any(grid._grid)
+
+
+def test_vector_engine_grows_and_compacts():
+    model = CityModel(300, seed=3, map_file=generated_map(40), engine="vectorized")
+    engine = model.car_engine
+    for _ in range(60):
+        model.step()
+    assert engine.count == model.car_count == len(engine.ids)
+    assert len(engine._ids) >= engine.count
+    assert set(engine.ids.tolist()) == set(model.occupancy[model.occupancy >= 0])
+    assert len(set(engine.ids.tolist())) == engine.count
+
+
+def test_maps_without_destinations(tmp_path):
+    with open(BASE_MAP) as base:
+        path = tmp_path / "no_destinations.txt"
+        path.write_text(base.read().replace("D", ">"))
+    for engine, routing in MODES:
+        model = CityModel(
+            10, map_file=str(path), engine=engine, routing=routing, seed=1
+        )
+        for _ in range(15):
+            model.step()
+        assert not model.destinations
+        assert model.car_count > 0
+        assert model.reached_destination == 0
+
+
+def test_static_map_is_shared():
+    static_map = load_static_map(BASE_MAP)
+    assert load_static_map(BASE_MAP) is static_map
+    first = CityModel(5, static_map=static_map)
+    second = CityModel(5, static_map=static_map)
+    assert first.path_finder.successors is second.path_finder.successors
+    assert first.occupancy is not second.occupancy
+
+
+def test_change_log():
+    log = ChangeLog(max_steps=3)
+    for step in range(1, 6):
+        log.car("car_0", (step, 0))
+        log.light("light_0", step % 2 == 0)
+        log.commit(step)
+    assert log.since(3) == ({"car_0": (5, 0)}, {"light_0": False})
+    assert log.since(1) is None
+    assert log.since(6) is None
+    log.reset(9)
+    assert log.since(9) == ({}, {})
+    assert log.since(8) is None
+
+
+# END STORAGE
@@ -0,0 +1,92 @@
+from src.model.city_model import CityModel
+from src.model.pathfinding import UNREACHABLE
+
+
+def build():
+    model = CityModel(0, seed=1)
+    finder = model.path_finder
+    x, y = model.destinations[0].pos
+    goal = x * model.height + y
+    return finder, goal, finder.distance_field(goal)
+
+
+def assert_drivable(finder, start, path, goal):
+    assert path[-1] == goal
+    for previous, cell in zip([start] + path, path):
+        assert cell in finder.successors[previous]
+
+
+def test_search_matches_distance_field():
+    finder, goal, field = build()
+    starts = [cell for cell, distance in enumerate(field) if distance > 0][:50]
+    assert starts
+    for start in starts:
+        path = finder.search(start, goal, lambda cell: False)
+        assert len(path) == field[start]
+        assert_drivable(finder, start, path, goal)
+        assert len(finder.route(start, field)) == len(path)
+
+
+def test_unreachable_cells():
+    finder, goal, field = build()
+    unreachable = [
+        cell for cell, distance in enumerate(field) if distance == UNREACHABLE
+    ]
+    assert unreachable
+    assert finder.route(unreachable[0], field) == []
+    assert finder.search(unreachable[0], goal, lambda cell: False) == []
+
+
+def repairs(finder, goal, field, use_field):
+    """(start, blocked cell, old path, repaired path) wherever a detour exists"""
+    found = []
+    for start, distance in enumerate(field):
+        if distance < 10:
+            continue
+        path = finder.route(start, field)
+        blocked = path[2]
+        repaired, walls = finder.repair(
+            start, path, lambda cell: cell == blocked, field if use_field else None
+        )
+        if repaired:
+            assert walls is None
+            found.append((start, blocked, path, repaired))
+    return found
+
+
+def test_repair_routes_around_blocked_cells():
+    finder, goal, field = build()
+    for use_field in (True, False):
+        found = repairs(finder, goal, field, use_field)
+        assert found
+        for start, blocked, path, repaired in found:
+            assert blocked not in repaired
+            assert_drivable(finder, start, repaired, goal)
+            # Once the detour meets the old path again, the rest is kept
+            rejoin = next(i for i, cell in enumerate(repaired) if cell in path[3:])
+            assert repaired[rejoin:] == path[path.index(repaired[rejoin]) :]
+
+
+def test_repair_leaves_free_paths_alone():
+    finder, goal, field = build()
+    start = next(cell for cell, distance in enumerate(field) if distance > 5)
+    path = finder.route(start, field)
+    assert finder.repair(start, path, lambda cell: False) == (path, None)
+
+
+def test_repair_reports_walls():
+    finder, goal, field = build()
+    start = next(cell for cell, distance in enumerate(field) if distance > 5)
+    path = finder.route(start, field)
+    exits = set(finder.successors[start])
+    repaired, walls = finder.repair(start, path, exits.__contains__, field)
+    assert repaired is None
+    assert set(walls) == exits
+
+
+def test_repair_budget():
+    finder, goal, field = build()
+    start, blocked, path, _ = repairs(finder, goal, field, True)[0]
+    assert finder.repair(
+        start, path, lambda cell: cell == blocked, field, budget=0
+    ) == (None, None)
@@ -0,0 +1,180 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from src.visualization.run_ahead import RunAhead
+from src.visualization.sessions import SessionRegistry
+from src.visualization.streaming import StepStream
+from src.visualization.trafficServer import advance, app, sessions
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def init(client, session, agents=10, **body):
+    response = client.post(
+        "/init", json={"NAgents": agents, **body}, headers={"X-Session-Id": session}
+    )
+    assert response.status_code == 200
+    return {"X-Session-Id": session}
+
+
+def test_init_rejects_unknown_routing(client):
+    response = client.post("/init", json={"NAgents": 5, "routing": "dijkstra"})
+    assert response.status_code == 400
+    assert "routing" in response.get_json()["error"]
+    assert client.post("/init", json={"NAgents": "many"}).status_code == 400
+
+
+def test_state_deltas(client):
+    headers = init(client, "deltas")
+    full = client.get("/state", headers=headers).get_json()
+    assert full["full"] and full["step"] == 0
+
+    client.post("/step", json={"n": 5}, headers=headers)
+    delta = client.get("/state?since=0", headers=headers).get_json()
+    assert not delta["full"] and delta["step"] == 5
+    now = client.get("/state", headers=headers).get_json()
+    positions = {car["id"]: (car["x"], car["z"]) for car in now["cars"]}
+    for car in delta["cars"]:
+        assert positions[car["id"]] == (car["x"], car["z"])
+
+    # A cursor ahead of the model falls back to the full state
+    assert client.get("/state?since=99", headers=headers).get_json()["full"]
+
+
+def test_frame_matches_state(client):
+    headers = init(client, "frames")
+    client.post("/step", json={"n": 3}, headers=headers)
+    state = client.get("/state", headers=headers).get_json()
+    frame = client.get("/frame", headers=headers).data
+
+    step, cars, lights = np.frombuffer(frame[:12], dtype="<u4").tolist()
+    assert (step, cars, lights) == (
+        state["step"],
+        len(state["cars"]),
+        len(state["traffic_lights"]),
+    )
+    index, x, z = np.frombuffer(frame[12 : 12 + 12 * cars], dtype="<i4").reshape(
+        3, cars
+    )
+    assert {
+        (f"car_{i}", a, b) for i, a, b in zip(index.tolist(), x.tolist(), z.tolist())
+    } == {(car["id"], car["x"], car["z"]) for car in state["cars"]}
+    green = np.unpackbits(
+        np.frombuffer(frame[12 + 12 * cars :], dtype=np.uint8), bitorder="little"
+    )[:lights]
+    assert green.astype(bool).tolist() == [
+        light["state"] for light in state["traffic_lights"]
+    ]
+
+
+def test_step_advances_n_steps(client):
+    headers = init(client, "multi-step")
+    response = client.post(
+        "/step",
+        json={"n": 7, "collect": False, "include_state": True, "since": 0},
+        headers=headers,
+    ).get_json()
+    assert response["currentStep"] == 7
+    assert response["state"]["step"] == 7 and not response["state"]["full"]
+    info = client.get("/info", headers=headers).get_json()
+    assert info["current_step"] == 7
+    assert client.post("/step", json={"n": 0}, headers=headers).status_code == 400
+
+
+def test_sessions_are_independent(client):
+    first = init(client, "first")
+    second = init(client, "second")
+    client.post("/step", json={"n": 4}, headers=first)
+    assert client.get("/info", headers=first).get_json()["current_step"] == 4
+    assert client.get("/info", headers=second).get_json()["current_step"] == 0
+
+    client.post("/reset", headers=first)
+    assert client.get("/state", headers=first).get_json()["step"] == 0
+    assert client.delete("/session", headers=second).status_code == 200
+    assert client.get("/state", headers=second).status_code == 400
+
+
+def test_registry_caps():
+    registry = SessionRegistry(max_sessions=2)
+    for name in ("a", "b", "c"):
+        registry.create(name, 1)
+    assert len(registry) == 2
+    assert registry.get("a") is None
+    assert registry.get("c") is not None
+
+
+def test_registry_evicts_idle_sessions_on_get():
+    registry = SessionRegistry(idle_seconds=0.05, eviction_interval=0)
+    registry.create("idle", 1)
+    registry.create("active", 1)
+    time.sleep(0.1)
+    assert registry.get("active") is not None
+    assert len(registry) == 1
+    assert registry.get("idle") is None
+
+
+def test_run_ahead(client):
+    headers = init(client, "ahead")
+    status = client.post("/runahead", json={"lead": 4}, headers=headers).get_json()
+    assert status["lead"] == 4
+    deadline = time.monotonic() + 10
+    while client.get("/runahead", headers=headers).get_json()["ahead"] < 4:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    assert json.loads(client.get("/state", headers=headers).data)["step"] == 0
+    step = client.post("/step", json={"n": 2}, headers=headers).get_json()
+    assert step["currentStep"] == 2
+    assert json.loads(client.get("/state?step=2", headers=headers).data)["step"] == 2
+    frame = client.get("/frame?step=2", headers=headers).data
+    assert np.frombuffer(frame[:4], dtype="<u4")[0] == 2
+
+    # Readers move at most `lead` steps, and deltas are not buffered
+    step = client.post("/step", json={"n": 100}, headers=headers).get_json()
+    assert step["currentStep"] == 6
+    for body in ({"since": 0}, {"collect": False}):
+        response = client.post("/step", json=body, headers=headers)
+        assert response.status_code == 400
+
+    assert client.delete("/runahead", headers=headers).status_code == 200
+    assert client.get("/runahead", headers=headers).status_code == 400
+
+
+def test_run_ahead_checks_buffered_steps():
+    session = sessions.create("buffer", 1)
+    run_ahead = RunAhead(
+        session.model, lambda: None, session.lock, lambda model: (b"", b""), 4
+    )
+    run_ahead.frames.append((5, (b"", b"")))
+    assert run_ahead.read("reader", 1, timeout=0) is None
+
+
+@pytest.mark.parametrize("worker", ["stream", "run_ahead"])
+def test_reset_stops_workers_first(worker):
+    registry = SessionRegistry()
+    for _ in range(20):
+        session = registry.create("race", 5)
+        if worker == "stream":
+            session.stream = StepStream(
+                session.model, lambda: advance(session), session.lock, rate=0
+            ).start()
+            thread = session.stream._thread
+        else:
+            session.run_ahead = RunAhead(
+                session.model,
+                lambda: advance(session),
+                session.lock,
+                lambda model: (b"", b""),
+            ).start()
+            thread = session.run_ahead._thread
+        time.sleep(0.001)
+        session.reset()
+        assert not thread.is_alive()
+        assert session.model.schedule.steps == 0
+        assert session.current_step == 0
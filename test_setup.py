@@ -1,26 +1,43 @@
-from trafficBase.model import CityModel
-from trafficBase.agent import *
+from src.model.city_model import CityModel
+from src.agents.car import Car
+from src.agents.road import Road
+from src.agents.traffic_light import Traffic_Light
+from src.agents.destination import Destination
+from src.agents.obstacle import Obstacle
 
 
 def test_basic_setup():
-    try:
-        # Test agent creation
-        road = Road("road_1", None, "Left")
-        traffic_light = Traffic_Light("light_1", None)
-        destination = Destination("dest_1", None)
-        obstacle = Obstacle("obs_1", None)
-        car = Car("car_1", None)
-        print("✓ All agents created successfully")
+    # Test model creation
+    model = CityModel(N=5, seed=1)
+    assert (model.grid.width, model.grid.height) == (model.width, model.height)
+    assert model.traffic_lights
+    assert model.destinations
+    assert 0 < model.car_count <= 5
 
-        # Test model creation
-        model = CityModel(N=5)
-        print("✓ Model created successfully")
-        print(f"Grid dimensions: {model.grid.width} x {model.grid.height}")
-        print(f"Number of traffic lights: {len(model.traffic_lights)}")
+    # Test agent creation
+    road = Road("road_1", model, "Left")
+    traffic_light = Traffic_Light("light_1", model)
+    destination = Destination("dest_1", model)
+    obstacle = Obstacle("obs_1", model)
+    car = Car("car_1", model)
+    assert road.direction == "Left"
+    assert traffic_light.state is False
+    assert destination.model is model and obstacle.model is model
+    assert car.destination in model.destinations
 
-    except Exception as e:
-        print(f"Error during testing: {e}")
+
+def test_steps():
+    model = CityModel(N=5, seed=1)
+    for _ in range(20):
+        model.step()
+    assert model.schedule.steps == 20
+    assert model.change_log.step == 20
+    assert 0 < model.car_count <= 5
+    assert len(model.datacollector.get_model_vars_dataframe()) == 20
+    # The occupancy layer holds exactly the cars
+    assert (model.occupancy >= 0).sum() == model.car_count
 
 
 if __name__ == "__main__":
     test_basic_setup()
+    test_steps()